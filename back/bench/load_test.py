@@ -0,0 +1,388 @@
+"""
+Test de charge de bout en bout : N utilisateurs simulés enchaînent
+/init-session, /upload et plusieurs tours de /chat sur une instance du
+backend, de préférence branchée sur bench/mock_openrouter.py.
+
+Pendant le test, /health est interrogé pour suivre le processus serveur
+(CPU, RSS, threads, retard de la boucle asyncio). Les résultats sont
+écrits en JSON pour comparer les runs entre commits.
+
+    uv run python -m bench.load_test --spawn --users 20 --turns 3
+    uv run python -m bench.load_test --url http://127.0.0.1:8000 --users 50
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Optional
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import httpx
+
+BACK_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+QUESTIONS = [
+    "Bonjour",
+    "Analyse cette mammographie, la masse est-elle maligne ?",
+    "Peux-tu décrire plus précisément la lésion ?",
+    "Merci",
+]
+
+
+@dataclass
+class RequestResult:
+    endpoint: str
+    ok: bool
+    latency: float  # en secondes
+    first_chunk: Optional[float] = None
+    size: int = 0
+    error: Optional[str] = None
+
+
+@dataclass
+class RunState:
+    results: list[RequestResult] = field(default_factory=list)
+    health: list[dict[str, Any]] = field(default_factory=list)
+
+
+def sample_image(seed: str) -> bytes:
+    """
+    Image PNG de bruit, générée et reproductible pour une graine donnée :
+    des graines différentes donnent des contenus (donc des hash) différents,
+    sinon les caches par contenu fausseraient la mesure.
+    """
+    from PIL import Image
+
+    size = 256
+    noise = random.Random(seed).randbytes(size * size)
+    buffer = io.BytesIO()
+    Image.frombytes("L", (size, size), noise).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def user_images(args: argparse.Namespace) -> list[Optional[bytes]]:
+    """Une image par utilisateur ; une part `duplicate_ratio` reprend la même."""
+    if args.no_upload:
+        return [None] * args.users
+    rng = random.Random(args.seed)
+    shared = sample_image(f"{args.seed}-shared")
+    return [
+        shared
+        if rng.random() < args.duplicate_ratio
+        else sample_image(f"{args.seed}-{index}")
+        for index in range(args.users)
+    ]
+
+
+async def timed(state: RunState, endpoint: str, request) -> Optional[httpx.Response]:
+    start = time.perf_counter()
+    try:
+        response = await request
+        response.raise_for_status()
+        state.results.append(RequestResult(endpoint, True, time.perf_counter() - start))
+        return response
+    except Exception as e:
+        state.results.append(
+            RequestResult(endpoint, False, time.perf_counter() - start, error=str(e))
+        )
+        return None
+
+
+async def chat(
+    client: httpx.AsyncClient, state: RunState, payload: dict[str, Any]
+) -> None:
+    start = time.perf_counter()
+    first_chunk = None
+    size = 0
+    try:
+        async with client.stream("POST", "/chat", json=payload) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                if first_chunk is None:
+                    first_chunk = time.perf_counter() - start
+                size += len(chunk)
+        state.results.append(
+            RequestResult("/chat", True, time.perf_counter() - start, first_chunk, size)
+        )
+    except Exception as e:
+        state.results.append(
+            RequestResult(
+                "/chat", False, time.perf_counter() - start, first_chunk, size, str(e)
+            )
+        )
+
+
+async def user_flow(
+    client: httpx.AsyncClient,
+    state: RunState,
+    image: Optional[bytes],
+    turns: int,
+    user_index: int,
+) -> None:
+    response = await timed(state, "/init-session", client.post("/init-session"))
+    if response is None:
+        return
+    session_id = response.json()["session_id"]
+
+    image_url = None
+    if image is not None:
+        files = {"file": (f"user-{user_index}.png", image, "image/png")}
+        response = await timed(state, "/upload", client.post("/upload", files=files))
+        if response is not None:
+            image_url = response.json()["url"]
+
+    for turn in range(turns):
+        question = QUESTIONS[(user_index + turn) % len(QUESTIONS)]
+        payload = {"question": question, "session_id": session_id}
+        if image_url is not None:
+            payload["image_url"] = image_url
+        await chat(client, state, payload)
+
+
+async def poll_health(
+    client: httpx.AsyncClient, state: RunState, interval: float, stop: asyncio.Event
+) -> None:
+    while not stop.is_set():
+        try:
+            response = await client.get("/health")
+            state.health.append({"t": time.time(), **response.json()})
+        except Exception:
+            pass
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def at(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": at(0.50),
+        "p90_ms": at(0.90),
+        "p95_ms": at(0.95),
+        "p99_ms": at(0.99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def summarize(state: RunState, wall_time: float) -> dict[str, Any]:
+    endpoints: dict[str, Any] = {}
+    for endpoint in sorted({r.endpoint for r in state.results}):
+        results = [r for r in state.results if r.endpoint == endpoint]
+        ok = [r for r in results if r.ok]
+        summary = {
+            "requests": len(results),
+            "errors": len(results) - len(ok),
+            "throughput_rps": len(ok) / wall_time if wall_time else 0.0,
+            "latency": percentiles([r.latency for r in ok]),
+        }
+        if endpoint == "/chat":
+            summary["time_to_first_chunk"] = percentiles(
+                [r.first_chunk for r in ok if r.first_chunk is not None]
+            )
+            summary["bytes"] = sum(r.size for r in ok)
+        errors = sorted({r.error for r in results if r.error})
+        if errors:
+            summary["error_samples"] = errors[:5]
+        endpoints[endpoint] = summary
+
+    server: dict[str, Any] = {}
+    runtime = [h["runtime"] for h in state.health if "runtime" in h]
+    if len(runtime) >= 2:
+        elapsed = state.health[-1]["t"] - state.health[0]["t"]
+        cpu = runtime[-1]["cpu_seconds"] - runtime[0]["cpu_seconds"]
+        lags = [r["loop_lag_ms"] for r in runtime]
+        server = {
+            "samples": len(runtime),
+            "cpu_percent": 100 * cpu / elapsed if elapsed else 0.0,
+            "rss_start_bytes": runtime[0]["rss_bytes"],
+            "rss_max_bytes": max(r["rss_bytes"] for r in runtime),
+            "threads_max": max(r["threads"] for r in runtime),
+            "loop_lag_p95_ms": sorted(lags)[int(0.95 * (len(lags) - 1))],
+            "loop_lag_max_ms": runtime[-1]["loop_max_lag_ms"],
+        }
+        if len({r["pid"] for r in runtime}) > 1:
+            server["note"] = "several workers answered /health; figures are mixed"
+
+    return {"wall_time_s": wall_time, "endpoints": endpoints, "server": server}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACK_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def wait_ready(url: str, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+def spawn(args: argparse.Namespace) -> list[subprocess.Popen]:
+    """Lance le serveur factice et le backend, sur des ports locaux."""
+    mock_port, api_port = args.mock_port, args.port
+    mock = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "bench.mock_openrouter",
+            "--port",
+            str(mock_port),
+            "--scale",
+            str(args.latency_scale),
+            "--seed",
+            str(args.seed),
+        ],
+        cwd=BACK_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    env = {
+        **os.environ,
+        "OPENROUTER_BASE_URL": f"http://127.0.0.1:{mock_port}/api/v1",
+        "OPENROUTER_API_KEY": "mock",
+    }
+    api = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "src.main:app",
+            "--port",
+            str(api_port),
+            "--workers",
+            str(args.workers),
+            "--log-level",
+            "warning",
+        ],
+        cwd=BACK_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return [mock, api]
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    state = RunState()
+    images = user_images(args)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    timeout = httpx.Timeout(args.timeout)
+
+    async with httpx.AsyncClient(
+        base_url=args.url, limits=limits, timeout=timeout
+    ) as client:
+        stop = asyncio.Event()
+        poller = asyncio.create_task(
+            poll_health(client, state, args.health_interval, stop)
+        )
+        start = time.perf_counter()
+
+        async def delayed_user(index: int):
+            # Montée en charge progressive sur `ramp` secondes
+            if args.users > 1:
+                await asyncio.sleep(args.ramp * index / (args.users - 1))
+            await user_flow(client, state, images[index], args.turns, index)
+
+        await asyncio.gather(*(delayed_user(i) for i in range(args.users)))
+        wall_time = time.perf_counter() - start
+        stop.set()
+        await poller
+
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {
+            key: value for key, value in vars(args).items() if key not in ("output",)
+        },
+        **summarize(state, wall_time),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default=None, help="Backend déjà lancé")
+    parser.add_argument("--spawn", action="store_true", help="Lance mock + backend")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--mock-port", type=int, default=8011)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--latency-scale", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--ramp", type=float, default=0.0, help="En secondes")
+    parser.add_argument("--no-upload", action="store_true")
+    parser.add_argument(
+        "--duplicate-ratio",
+        type=float,
+        default=0.0,
+        help="Part des utilisateurs qui envoient la même image (0 à 1)",
+    )
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--health-interval", type=float, default=0.5)
+    parser.add_argument(
+        "--output",
+        default=os.path.join(BACK_DIR, "data", "bench", "load_test.json"),
+    )
+    args = parser.parse_args()
+
+    processes: list[subprocess.Popen] = []
+    if args.spawn:
+        args.url = f"http://127.0.0.1:{args.port}"
+        processes = spawn(args)
+    elif args.url is None:
+        args.url = "http://127.0.0.1:8000"
+
+    try:
+        asyncio.run(wait_ready(args.url))
+        report = asyncio.run(run(args))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+
+    chat = report["endpoints"].get("/chat", {})
+    print(
+        f"{args.users} users x {args.turns} turns in {report['wall_time_s']:.1f}s | "
+        f"chat p50 {chat.get('latency', {}).get('p50_ms', 0):.0f} ms, "
+        f"p95 {chat.get('latency', {}).get('p95_ms', 0):.0f} ms, "
+        f"TTFC p50 {chat.get('time_to_first_chunk', {}).get('p50_ms', 0):.0f} ms, "
+        f"errors {chat.get('errors', 0)} -> {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
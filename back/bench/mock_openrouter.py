@@ -0,0 +1,218 @@
+"""
+Serveur local compatible OpenRouter (POST /api/v1/chat/completions, en
+streaming SSE) pour mesurer le backend sans appeler l'API réelle.
+
+Le temps jusqu'au premier token et le débit sont tirés des générations
+réelles de `openrouter_activity_2025-12-19.csv` ; les réponses sont des
+sorties fixes du Planner, de l'Exécuteur, de la Vision et du Réactif.
+
+    uv run python -m bench.mock_openrouter --port 8001
+    OPENROUTER_BASE_URL=http://127.0.0.1:8001/api/v1 OPENROUTER_API_KEY=mock \\
+        uv run fastapi dev src/main.py
+"""
+
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Optional
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import re
+import time
+import uuid
+import uvicorn
+
+BACK_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+ACTIVITY_CSV = os.path.join(BACK_DIR, "openrouter_activity_2025-12-19.csv")
+
+
+@dataclass
+class LatencyProfile:
+    ttft: float  # en secondes
+    generation_time: float  # après le premier token : TTFT non inclus
+    tokens_completion: int
+
+
+def load_profiles(path: str) -> dict[str, list[LatencyProfile]]:
+    """Profils par modèle (model_permaslug), générations annulées exclues."""
+    profiles: dict[str, list[LatencyProfile]] = {}
+    with open(path, newline="", encoding="utf-8") as file:
+        for row in csv.DictReader(file):
+            try:
+                if row["cancelled"] == "true" or not row["time_to_first_token_ms"]:
+                    continue
+                profile = LatencyProfile(
+                    ttft=float(row["time_to_first_token_ms"]) / 1000,
+                    generation_time=float(row["generation_time_ms"]) / 1000,
+                    tokens_completion=max(1, int(row["tokens_completion"])),
+                )
+            except (KeyError, ValueError):
+                continue
+            profiles.setdefault(row["model_permaslug"], []).append(profile)
+    return profiles
+
+
+PLAN = [
+    {
+        "step_id": "step_1",
+        "title": "Pertinence de l'image",
+        "description": "Décrire l'image et vérifier qu'il s'agit d'une mammographie.",
+        "dependencies": [],
+    },
+    {
+        "step_id": "step_2",
+        "title": "Classification",
+        "description": "Classifier la masse (maligne ou bénigne).",
+        "dependencies": ["step_1"],
+    },
+]
+
+VISION = (
+    "Mammographie en incidence oblique. On observe une masse ovale aux contours "
+    "circonscrits dans le quadrant supéro-externe, sans microcalcifications "
+    "suspectes ni distorsion architecturale."
+)
+
+REACTIVE = (
+    "L'analyse d'image montre une masse ovale bien circonscrite. La "
+    "classification automatique oriente vers une lésion bénigne. Ce résultat "
+    "ne remplace pas l'avis d'un radiologue : un contrôle échographique est "
+    "recommandé."
+)
+
+
+def canned_response(messages: list[dict[str, Any]]) -> str:
+    """Réponse fixe selon l'agent appelant (reconnu à son prompt système)."""
+    system = str(messages[0].get("content", "")) if messages else ""
+    user = messages[-1].get("content", "") if messages else ""
+    if not isinstance(user, str):
+        # Vision : contenu multimodal (texte + image)
+        return VISION
+
+    if "Planner Clinique" in system:
+        has_image = "User uploaded image" in user
+        return json.dumps(PLAN if has_image else [], ensure_ascii=False)
+    if "Exécuteur Clinique" in system:
+        if "PLAN :" in user:
+            steps = re.findall(r'"step_id": "([^"]+)"', user)
+            return json.dumps({step: tool_call(step) for step in steps})
+        return json.dumps(tool_call(user))
+    if "Expert Vision" in system:
+        return VISION
+    return REACTIVE
+
+
+def tool_call(text: str) -> list[dict[str, Any]]:
+    if "lassif" in text or text == "step_2":
+        return [{"function_name": "classification_tool", "args": ["image_path"]}]
+    return [{"function_name": "vision_tool", "args": ["image_path", text]}]
+
+
+def split_tokens(text: str) -> list[str]:
+    """Découpage approximatif en tokens (~4 caractères)."""
+    return [text[i : i + 4] for i in range(0, len(text), 4)] or [""]
+
+
+def estimate_tokens(messages: list[dict[str, Any]]) -> int:
+    return len(json.dumps(messages, ensure_ascii=False)) // 4 + 1
+
+
+class MockOpenRouter:
+    def __init__(
+        self,
+        profiles: dict[str, list[LatencyProfile]],
+        scale: float = 1.0,
+        seed: Optional[int] = None,
+    ):
+        self.profiles = profiles
+        self.all_profiles = [p for group in profiles.values() for p in group]
+        self.scale = scale
+        self.random = random.Random(seed)
+
+    def sample(self, model: str) -> LatencyProfile:
+        # "google/gemma-3-27b-it:free" -> "google/gemma-3-27b-it"
+        candidates = self.profiles.get(model.split(":")[0]) or self.all_profiles
+        if not candidates:
+            return LatencyProfile(0.0, 0.0, 1)
+        return self.random.choice(candidates)
+
+    async def stream(self, body: dict[str, Any]) -> AsyncGenerator[bytes, None]:
+        model = body.get("model", "")
+        messages = body.get("messages", [])
+        tokens = split_tokens(canned_response(messages))
+        profile = self.sample(model)
+        # Débit réel de la génération tirée, appliqué à la réponse fixe
+        per_token = profile.generation_time / profile.tokens_completion
+        completion_id = f"gen-mock-{uuid.uuid4().hex[:20]}"
+        created = int(time.time())
+
+        def chunk(delta: dict, finish_reason=None, usage=None) -> bytes:
+            data = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [
+                    {"index": 0, "delta": delta, "finish_reason": finish_reason}
+                ],
+            }
+            if usage is not None:
+                data["choices"] = []
+                data["usage"] = usage
+            return f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode()
+
+        await asyncio.sleep(profile.ttft * self.scale)
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(per_token * self.scale)
+            delta = {"role": "assistant", "content": token}
+            yield chunk(delta)
+        yield chunk({"content": ""}, finish_reason="stop")
+
+        prompt_tokens = estimate_tokens(messages)
+        yield chunk(
+            {},
+            usage={
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(tokens),
+                "total_tokens": prompt_tokens + len(tokens),
+            },
+        )
+        yield b"data: [DONE]\n\n"
+
+
+def create_app(
+    csv_path: str = ACTIVITY_CSV, scale: float = 1.0, seed: Optional[int] = None
+) -> FastAPI:
+    mock = MockOpenRouter(load_profiles(csv_path), scale, seed)
+    app = FastAPI(title="Mock OpenRouter")
+
+    @app.post("/api/v1/chat/completions")
+    async def chat_completions(request: Request) -> StreamingResponse:
+        body = await request.json()
+        return StreamingResponse(mock.stream(body), media_type="text/event-stream")
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--csv", default=ACTIVITY_CSV)
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=1.0,
+        help="Facteur appliqué aux latences (0 : sans attente)",
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    uvicorn.run(
+        create_app(args.csv, args.scale, args.seed), host=args.host, port=args.port
+    )
@@ -1,17 +1,11 @@
-from typing import Generator, Optional
-from openrouter import OpenRouter
-from dotenv import dotenv_values
+from typing import AsyncGenerator, Optional
 from openrouter import components
 import time
 import uuid
-from src.agents.telemetrics import append_to_csv
+from src.agents.client import get_client
+from src.agents.telemetrics import record_telemetry
 from src.core.models import AgentData, AgentType, AgentsMetrics, AgentResponse, Status
-import os
-
-config = dotenv_values(".env")
-OPENROUTER_API_KEY = config.get("OPENROUTER_API_KEY") or os.environ.get(
-    "OPENROUTER_API_KEY"
-)
+from src.core.tracing import record_span
 
 
 class Agent:
@@ -22,7 +16,7 @@ class Agent:
         agent_data: Optional[AgentData] = None,
         model: str = "google/gemma-3-27b-it:free",
     ):
-        self.client = OpenRouter(api_key=OPENROUTER_API_KEY)
+        self.client = get_client()
         self.model = model
         self.system_prompt = system_prompt
         self.last_response: str = ""
@@ -45,9 +39,43 @@ class Agent:
         if task:
             task.status = new_status
 
-    def ask(
+    def record_generation(
+        self,
+        sent_at: float,
+        connected_at: float,
+        first_token_at: Optional[float],
+        output_tokens: float,
+    ):
+        """
+        TTFT et débit du dernier appel dans AgentData, et spans de l'appel :
+        envoi jusqu'aux en-têtes, attente du premier token, génération.
+        """
+        end = time.perf_counter()
+        if first_token_at is not None:
+            generation_time = end - first_token_at
+            self.agent_data.ttft = first_token_at - sent_at
+            self.agent_data.tokens_per_second = (
+                output_tokens / generation_time if generation_time > 0 else 0.0
+            )
+
+        record_span(
+            f"llm:{self.agent_data.type.value}",
+            sent_at,
+            end,
+            agent_id=self.agent_data.id,
+            model=self.model,
+            ttft_ms=self.agent_data.ttft * 1000,
+            output_tokens=output_tokens,
+            tokens_per_second=self.agent_data.tokens_per_second,
+        )
+        record_span("llm.request", sent_at, connected_at)
+        if first_token_at is not None:
+            record_span("llm.first_token", connected_at, first_token_at)
+            record_span("llm.generation", first_token_at, end)
+
+    async def ask(
         self, prompt: str, metrics: AgentsMetrics
-    ) -> Generator[AgentResponse, None, None]:
+    ) -> AsyncGenerator[AgentResponse, None]:
         self.last_response = ""
         metrics.agents[self.agent_data.id] = self.agent_data
 
@@ -60,17 +88,20 @@ class Agent:
             {"role": "user", "content": prompt},
         ]
 
-        stream = self.client.chat.send(
+        sent_at = time.perf_counter()
+        stream = await self.client.chat.send_async(
             model=self.model,
             messages=messages,
             stream=True,
             stream_options=components.ChatStreamOptions(include_usage=True),
         )
+        connected_at = time.perf_counter()
+        first_token_at: Optional[float] = None
 
         start_time = time.time()
         current_output_tokens = 0
 
-        for event in stream:
+        async for event in stream:
             request_duration = time.time() - start_time
 
             self.agent_data.time_taken = base_time_taken + request_duration
@@ -94,6 +125,8 @@ class Agent:
             chunk: Optional[str] = event.choices[0].delta.content  # type:ignore
 
             if chunk:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
                 current_output_tokens += 1
                 self.agent_data.output_token_count = (
                     base_output_tokens + current_output_tokens
@@ -105,10 +138,16 @@ class Agent:
 
         request_duration = time.time() - start_time
         self.agent_data.time_taken = base_time_taken + request_duration
+        self.record_generation(
+            sent_at,
+            connected_at,
+            first_token_at,
+            self.agent_data.output_token_count - base_output_tokens,
+        )
         metrics.agents[self.agent_data.id] = self.agent_data
 
         # csv_header = ["timestamp", "model_kind", "model_name", "input_tokens", "output_tokens", "time_taken"]
-        append_to_csv(
+        record_telemetry(
             str(self.agent_data.type),
             self.model,
             self.agent_data.input_token_count,
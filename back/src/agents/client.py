@@ -0,0 +1,47 @@
+from typing import Optional
+from openrouter import OpenRouter
+from src.core.config import (
+    OPENROUTER_API_KEY,
+    OPENROUTER_BASE_URL,
+    OPENROUTER_KEEPALIVE_EXPIRY,
+    OPENROUTER_MAX_CONNECTIONS,
+    OPENROUTER_MAX_KEEPALIVE_CONNECTIONS,
+)
+import httpx
+
+_client: Optional[OpenRouter] = None
+
+
+def get_client() -> OpenRouter:
+    """
+    Client OpenRouter partagé par tous les agents du processus.
+    Les connexions HTTP sont gardées ouvertes (keep-alive) entre les appels,
+    ce qui évite une poignée de main TLS à chaque agent.
+    """
+    global _client
+    if _client is None:
+        limits = httpx.Limits(
+            max_connections=OPENROUTER_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENROUTER_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=OPENROUTER_KEEPALIVE_EXPIRY,
+        )
+        _client = OpenRouter(
+            api_key=OPENROUTER_API_KEY,
+            server_url=OPENROUTER_BASE_URL,
+            client=httpx.Client(follow_redirects=True, limits=limits),
+            async_client=httpx.AsyncClient(follow_redirects=True, limits=limits),
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is None:
+        return
+
+    configuration = _client.sdk_configuration
+    if configuration.client is not None:
+        configuration.client.close()
+    if configuration.async_client is not None:
+        await configuration.async_client.aclose()
+    _client = None
@@ -4,11 +4,27 @@ from src.agents.agent import Agent, AgentResponse
 from src.core.models import AgentData, AgentType, AgentsMetrics, Status
 from src.core.task import Tasks, PlannedTask
 from src.agents.memory import MemoryAgent
-from src.agents.vision import VisionAgent
+from src.agents.vision import VisionAgent, resolve_image_path
+from src.core.cache import ResultCache, hash_file, make_key
+from src.core.prefetch import SpeculativePrefetch
+from src.core.router import is_generic_vision, match_tool
+from src.core.tracing import set_lane, span
+from src.core.config import (
+    DIRECT_TOOL_DISPATCH,
+    PREFETCH_TTL,
+    PREFETCH_VISION,
+    PREFETCH_VISION_INSTRUCTION,
+    RESULT_CACHE_DB,
+    RESULT_CACHE_MAX_BYTES,
+    RESULT_CACHE_SIZE,
+)
 from src.tools import classification_tool
+import asyncio
+import inspect
 import json
 import logging
 import os
+import uuid
 
 log_dir = os.path.join(os.getcwd(), "data", "logs")
 os.makedirs(log_dir, exist_ok=True)
@@ -20,23 +36,44 @@ logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(message)s",
 )
 
-vision_agent = VisionAgent()
+
+vision_cache = ResultCache(
+    "vision", RESULT_CACHE_SIZE, RESULT_CACHE_MAX_BYTES, RESULT_CACHE_DB
+)
 
 
-def vision_tool(
+async def vision_tool(
     image_path: str, instruction: str, metrics: Optional[AgentsMetrics] = None
 ):
     if not metrics:
         return "[Error] Metrics needed for vision agent"
 
+    # Un agent par appel : les tâches du plan peuvent tourner en parallèle
+    vision_agent = VisionAgent()
+
+    # Même image, même instruction, même modèle : pas de nouvel appel LLM
+    cache_key = None
+    real_path = resolve_image_path(image_path)
+    if os.path.exists(real_path):
+        image_hash = await asyncio.to_thread(hash_file, real_path)
+        cache_key = make_key(image_hash, instruction, vision_agent.model)
+        # Le cache peut être adossé à SQLite (RESULT_CACHE_DB)
+        cached = await asyncio.to_thread(vision_cache.get, cache_key)
+        if cached is not None:
+            return cached
+
     full_response = ""
     try:
-        for response in vision_agent.analyze(instruction, image_path, metrics):
+        async for response in vision_agent.analyze(instruction, image_path, metrics):
             full_response += response.chunk
-        return full_response
     except Exception as e:
         return f"Error executing vision agent: {e}"
 
+    # Une réponse interrompue en cours de flux ne doit pas être mise en cache
+    if cache_key and full_response and not vision_agent.failed:
+        await asyncio.to_thread(vision_cache.set, cache_key, full_response)
+    return full_response
+
 
 def duckdb_tool(sql_query: str):
     return f"[MOCK] Résultat SQL pour '{sql_query}': 42 cases found."
@@ -54,6 +91,30 @@ tool_registry: Dict[str, Callable] = {
 }
 
 
+prefetch = SpeculativePrefetch(PREFETCH_TTL)
+
+
+def prefetch_image(image_url: str):
+    """
+    Lance par anticipation les outils d'image sur un upload. Les résultats
+    arrivent dans les caches par contenu ; un appel identique de l'Exécuteur
+    attend le travail en cours au lieu de le relancer.
+    La description générique (PREFETCH_VISION) est indexée sur l'image seule :
+    l'instruction réelle n'est connue qu'au moment du plan.
+    """
+    prefetch.start(
+        asyncio.to_thread(classification_tool, image_url),
+        "classification_tool",
+        image_url,
+    )
+    if PREFETCH_VISION:
+        prefetch.start(
+            vision_tool(image_url, PREFETCH_VISION_INSTRUCTION, AgentsMetrics()),
+            "vision_tool",
+            image_url,
+        )
+
+
 @dataclass
 class ToolExecutor:
     function_name: str
@@ -142,89 +203,251 @@ FORMAT JSON OBLIGATOIRE :
             logging.error(f"Failed to parse json : {e}")
             return []
 
-    def exec_tools(self, tool: ToolExecutor, metrics: AgentsMetrics) -> Any:
+    def direct_tool(self, task: PlannedTask) -> Optional[ToolExecutor]:
+        """
+        Appel d'outil déterminé sans LLM : celui fourni par le Planner, ou
+        celui qu'un seul outil d'image correspond à la description.
+        """
+        if not DIRECT_TOOL_DISPATCH:
+            return None
+
+        if task.tool is not None:
+            function_name = task.tool.get("function_name") or task.tool.get("name")
+            args = task.tool.get("args", [])
+            if function_name not in tool_registry or not isinstance(args, list):
+                return None
+            # Champ recopié de l'exemple du prompt : la description désigne
+            # un autre outil, l'Exécuteur LLM tranche
+            matched = match_tool(f"{task.title} {task.description}")
+            if matched is not None and matched != function_name:
+                return None
+        elif self.image_url is not None:
+            function_name = match_tool(f"{task.title} {task.description}")
+            args = []
+        else:
+            return None
+
+        if function_name == "vision_tool" and len(args) < 2:
+            args = [self.image_url, task.description]
+        elif function_name == "classification_tool" and not args:
+            args = [self.image_url]
+        return ToolExecutor(function_name, args) if function_name else None
+
+    async def exec_tools(self, tool: ToolExecutor, metrics: AgentsMetrics) -> Any:
         """
         Exécution générique via le TOOL_REGISTRY.
         Les arguments doivent DÉJÀ être résolus (pas de '$var').
+        Les outils synchrones (ex: inférence TF) tournent dans un thread.
         """
-        tool_func = tool_registry.get(tool.function_name)
+        with span(f"tool:{tool.function_name}"):
+            tool_func = tool_registry.get(tool.function_name)
 
-        if not tool_func:
-            error_msg = f"Outil inconnu : {tool.function_name}"
-            logging.error(error_msg)
-            return f"Error: {error_msg}"
+            if not tool_func:
+                error_msg = f"Outil inconnu : {tool.function_name}"
+                logging.error(error_msg)
+                return f"Error: {error_msg}"
 
-        try:
-            clean_args = tool.args
-            if tool.function_name == "vision_tool":
-                result = tool_func(self.image_url, *clean_args[1:], metrics=metrics)  # type: ignore
-            elif tool.function_name == "classification_tool":
-                result = tool_func(self.image_url, *clean_args[1:])
-            else:
-                result = tool_func(*clean_args)
-
-            logging.info(f"Tool '{tool.function_name}' executed. Result: {result}")
-            return result
-        except Exception as e:
-            logging.error(f"Error executing {tool.function_name}: {e}")
-            return f"Error executing {tool.function_name}: {e}"
+            try:
+                clean_args = tool.args
+                kwargs = {}
+                if tool.function_name == "vision_tool":
+                    clean_args = [self.image_url, *clean_args[1:]]
+                    kwargs["metrics"] = metrics
+                elif tool.function_name == "classification_tool":
+                    clean_args = [self.image_url, *clean_args[1:]]
+
+                speculative = prefetch.claim(tool.function_name, *map(str, clean_args))
+                if (
+                    speculative is None
+                    and tool.function_name == "vision_tool"
+                    and is_generic_vision(" ".join(map(str, clean_args[1:])))
+                ):
+                    # Instruction générique (description, pertinence) : la
+                    # description préparée à l'upload tient lieu de résultat ;
+                    # une question précise déclenche un vrai appel
+                    speculative = prefetch.claim("vision_tool", self.image_url)
+                if speculative is not None:
+                    result = await speculative
+                    if not str(result).startswith("Error"):
+                        logging.info(f"Tool '{tool.function_name}' prefetched.")
+                        return result
+
+                if inspect.iscoroutinefunction(tool_func):
+                    result = await tool_func(*clean_args, **kwargs)
+                else:
+                    result = await asyncio.to_thread(tool_func, *clean_args, **kwargs)
+
+                logging.info(f"Tool '{tool.function_name}' executed. Result: {result}")
+                return result
+            except Exception as e:
+                logging.error(f"Error executing {tool.function_name}: {e}")
+                return f"Error executing {tool.function_name}: {e}"
 
-    def execute_task(
+    async def execute_task(
         self,
         task: PlannedTask,
         tasks: Tasks,
         metrics: AgentsMetrics,
         memory: MemoryAgent,
+        batch: Optional["BatchedToolCalls"] = None,
     ):
         """
         Exécute la tâche en utilisant la mémoire partagée.
         """
+        with span(f"task:{task.step_id}", title=task.title):
+            # 1. Validation Dépendances
+            if tasks.dependencies_met(task):
+                # Update status
+                self.update_status(Status.PENDING, metrics, task)
+
+                # 2. Outil connu d'avance, ou résolu par l'appel groupé du plan :
+                # pas d'appel LLM pour cette tâche
+                direct = self.direct_tool(task)
+                dispatch = "tool_dispatch_direct"
+                calls = [direct] if direct is not None else None
+                if calls is None and batch is not None:
+                    with span("executor.batch_wait"):
+                        calls = await batch.get(task.step_id)
+                    dispatch = "tool_dispatch_batch"
+                if calls is None:
+                    dispatch = "tool_dispatch_llm"
+                    async for response in self.ask(task.description, metrics):
+                        yield response
+                metrics.counters[dispatch] = metrics.counters.get(dispatch, 0) + 1
+
+                self.update_status(Status.FINISHED, metrics, task)
+            else:
+                self.update_status(Status.BLOCKED, metrics, task)
+                yield AgentResponse(
+                    metrics=metrics,
+                    id=self.agent_data.id,
+                    chunk="\n\n**Erreur : Dépendances non satisfaites.**",
+                )
+                return
 
-        # 1. Validation Dépendances
-        if tasks.dependencies_met(task):
-            # Update status
-            self.update_status(Status.PENDING, metrics, task)
-
-            for response in self.ask(task.description, metrics):
-                yield response
-
-            self.update_status(Status.FINISHED, metrics, task)
-        else:
-            self.update_status(Status.BLOCKED, metrics, task)
-            yield AgentResponse(
-                metrics=metrics,
-                id=self.agent_data.id,
-                chunk="\n\n**Erreur : Dépendances non satisfaites.**",
+            tools_to_call = (
+                calls if calls is not None else self.parse_tools(self.last_response)
             )
-            return
 
-        tools_to_call = self.parse_tools(self.last_response)
+            for tool in tools_to_call:
+                try:
+                    original_args = tool.args
+                    tool.args = memory.resolve_args(tool.args)
+
+                    if tool.args != original_args:
+                        yield AgentResponse(
+                            metrics=metrics,
+                            id=self.agent_data.id,
+                            chunk=f"\n> *Mémoire : Résolution {original_args} -> {tool.args}*",
+                        )
+                except Exception as e:
+                    yield AgentResponse(
+                        metrics=metrics,
+                        id=self.agent_data.id,
+                        chunk=f"\n**Erreur Mémoire : {e}**",
+                    )
+                    continue
 
-        for tool in tools_to_call:
-            try:
-                original_args = tool.args
-                tool.args = memory.resolve_args(tool.args)
+                result = await self.exec_tools(tool, metrics)
+                memory.set(task.step_id, result)
 
-                if tool.args != original_args:
+                if result is not None:
                     yield AgentResponse(
                         metrics=metrics,
                         id=self.agent_data.id,
-                        chunk=f"\n> *Mémoire : Résolution {original_args} -> {tool.args}*",
+                        chunk=f"\n\n**Résultat de l'outil '{tool.function_name}' :** {result}",
                     )
-            except Exception as e:
-                yield AgentResponse(
-                    metrics=metrics,
-                    id=self.agent_data.id,
-                    chunk=f"\n**Erreur Mémoire : {e}**",
-                )
-                continue
 
-            result = self.exec_tools(tool, metrics)
-            memory.set(task.step_id, result)
 
-            if result is not None:
-                yield AgentResponse(
-                    metrics=metrics,
-                    id=self.agent_data.id,
-                    chunk=f"\n\n**Résultat de l'outil '{tool.function_name}' :** {result}",
-                )
+class BatchedToolCalls:
+    """
+    Appels d'outils de tout le plan, résolus en une seule requête à
+    l'Exécuteur au lieu d'une par tâche. Les références "$step_id" sont
+    conservées et résolues ensuite par la mémoire, tâche par tâche. Une
+    étape absente ou mal formée dans la réponse (ou une requête en échec)
+    renvoie None : la tâche repasse alors par son propre appel LLM.
+    """
+
+    def __init__(self, image_url: Optional[str]):
+        self.executor = ExecutorAgent(
+            AgentData(id=str(uuid.uuid4()), type=AgentType.EXECUTOR), image_url
+        )
+        self.calls: Dict[str, List[ToolExecutor]] = {}
+        self.resolved = asyncio.Event()
+        self.request: Optional[asyncio.Task] = None
+
+    def start(self, tasks: Tasks, metrics: AgentsMetrics):
+        """À appeler une fois le plan complet."""
+        pending = [t for t in tasks if self.executor.direct_tool(t) is None]
+        if len(pending) < 2:
+            # Rien à grouper : chaque tâche garde son propre appel
+            self.resolved.set()
+            return
+        self.executor.agent_data.dependencies = [tasks.default_dep]
+        self.request = asyncio.create_task(self.resolve(pending, metrics))
+
+    async def resolve(self, pending: List[PlannedTask], metrics: AgentsMetrics):
+        set_lane("executor batch")
+        plan = json.dumps(
+            [
+                {
+                    "step_id": t.step_id,
+                    "title": t.title,
+                    "description": t.description,
+                }
+                for t in pending
+            ],
+            ensure_ascii=False,
+        )
+        prompt = f"""Voici le plan complet, dans l'ordre d'exécution.
+Pour CHAQUE tâche, donne les appels d'outils comme pour une tâche seule (liste vide si aucun outil n'est nécessaire).
+Garde TELLES QUELLES les références aux étapes précédentes (ex: "$step_1").
+Renvoie UNIQUEMENT un objet JSON : {{"step_id": [{{"function_name": "...", "args": [...]}}]}}
+
+PLAN :
+{plan}"""
+        try:
+            async for _ in self.executor.ask(prompt, metrics):
+                pass
+            self.calls = self.parse(self.executor.last_response)
+        except Exception as e:
+            logging.error(f"Batched executor call failed: {e}")
+        finally:
+            self.resolved.set()
+
+    @staticmethod
+    def parse(json_response: str) -> Dict[str, List[ToolExecutor]]:
+        cleaned = json_response.replace("```json", "").replace("```", "").strip()
+        start, end = cleaned.find("{"), cleaned.rfind("}")
+        try:
+            data = json.loads(cleaned[start : end + 1])
+        except json.JSONDecodeError as e:
+            logging.error(f"Failed to parse batched tool calls : {e}")
+            return {}
+        if not isinstance(data, dict):
+            return {}
+
+        calls = {}
+        for step_id, items in data.items():
+            if not isinstance(items, list):
+                continue
+            step_calls = [
+                ToolExecutor(item["function_name"], item.get("args", []))
+                for item in items
+                if isinstance(item, dict)
+                and item.get("function_name") in tool_registry
+                and isinstance(item.get("args", []), list)
+            ]
+            # Une étape partiellement valide est refaite entièrement
+            if len(step_calls) == len(items):
+                calls[step_id] = step_calls
+        return calls
+
+    async def get(self, step_id: str) -> Optional[List[ToolExecutor]]:
+        await self.resolved.wait()
+        return self.calls.get(step_id)
+
+    def close(self):
+        if self.request is not None:
+            self.request.cancel()
+        self.resolved.set()
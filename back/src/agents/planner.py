@@ -1,10 +1,39 @@
-from typing import Optional
+from typing import Any, AsyncGenerator, Dict, Optional
 from src.agents.agent import Agent, AgentResponse
-from src.agents.executor import ExecutorAgent
+from src.agents.executor import BatchedToolCalls, ExecutorAgent
 from src.agents.reactive import ReactiveAgent
 from src.agents.memory import MemoryAgent
+from src.core.config import (
+    EXECUTOR_BATCH,
+    HISTORY_KEEP_TURNS,
+    HISTORY_MAX_TOKENS,
+    PLAN_CACHE_POLICY,
+    PLAN_CACHE_SIZE,
+    PLAN_CACHE_TTL,
+    PLAN_MAX_WORKERS,
+    ROUTER_ENABLED,
+    ROUTER_MAX_WORDS,
+    ROUTER_TOOL_THRESHOLD,
+    TOOL_RESULT_MAX_CHARS,
+    TOOL_RESULTS_MAX_CHARS,
+)
+from src.core.history import ConversationHistory
+from src.core.plan_cache import PlanCache
+from src.core.results import TurnResults
+from src.core.router import RequestRouter, Route
 from src.core.models import AgentType, AgentsMetrics, Status
-from src.core.task import Tasks
+from src.core.scheduler import TaskScheduler
+from src.core.task import PlannedTask, PlanStreamParser, Tasks
+from src.core.tracing import record_span
+import asyncio
+import time
+
+plan_cache = PlanCache(PLAN_CACHE_POLICY, PLAN_CACHE_TTL, PLAN_CACHE_SIZE)
+router = RequestRouter(ROUTER_ENABLED, ROUTER_TOOL_THRESHOLD, ROUTER_MAX_WORDS)
+
+
+class PlanningError(Exception):
+    pass
 
 
 class PlannerAgent(Agent):
@@ -44,74 +73,131 @@ Format JSON attendu :
     "dependencies": []
   }
 ]
+Champ optionnel "tool" : seulement si la tâche appelle un seul outil connu et que sa description correspond à cet outil, ajoute l'appel exact, par exemple "tool": {"function_name": "classification_tool", "args": ["image_path"]} pour une tâche de classification. L'Executor l'exécutera directement. Sinon, n'ajoute pas ce champ.
 """
         super().__init__(system_prompt, AgentType.PLANNER)
-        self.logs = []
-        self.chat_history = []
-
-    def plan(self, request: str, metrics: AgentsMetrics, image_url: Optional[str]):
-        yield AgentResponse(
-            metrics=metrics,
-            id=self.agent_data.id,
-            chunk="**Phase 1 : Planification Stratégique**\n\n",
-        )
+        self.history = ConversationHistory(HISTORY_MAX_TOKENS, HISTORY_KEEP_TURNS)
 
-        # Format history for context
-        history_str = ""
-        if self.chat_history:
-            history_str = "HISTORIQUE DE LA CONVERSATION PRÉCÉDENTE :\n"
-            for msg in self.chat_history:
-                role = "Utilisateur" if msg["role"] == "user" else "Assistant"
-                history_str += f"- {role}: {msg['content']}\n"
-            history_str += "\n"
+    def export_state(self) -> Dict[str, Any]:
+        return {"history": self.history.export_state()}
 
-        prompt = f"{history_str}Nouvelle requête à planifier : {request}"
-        if image_url is not None:
-            prompt += f"\nUser uploaded image: {image_url}"
+    def load_state(self, state: Dict[str, Any]):
+        if "chat_history" in state:
+            # Sessions enregistrées avant le résumé glissant
+            self.history = ConversationHistory.from_messages(
+                state["chat_history"], HISTORY_MAX_TOKENS, HISTORY_KEEP_TURNS
+            )
+        else:
+            self.history.load_state(state.get("history", {}))
 
-        full_response = ""
-        try:
-            for response in self.ask(prompt, metrics):
-                full_response += response.chunk
-                yield response
-        except Exception as e:
-            print(f"Erreur lors de la génération du plan : {e}")
-            return []
+    async def plan(
+        self, request: str, metrics: AgentsMetrics, image_url: Optional[str]
+    ) -> AsyncGenerator[AgentResponse, None]:
+        plan_started_at = time.perf_counter()
+        # History for context, bounded to HISTORY_MAX_TOKENS
+        history_str = self.history.render()
+        has_image = image_url is not None
 
-        tasks = Tasks(full_response, self.agent_data.id)
-        memory = MemoryAgent()
-        last_agent_id = self.agent_data.id
+        tasks = Tasks("[]", self.agent_data.id)
+        planning: Optional[AsyncGenerator[AgentResponse, None]] = None
+        batch: Optional[BatchedToolCalls] = None
+        use_cache = False
+        parser: Optional[PlanStreamParser] = None
+        # En-tête de la phase 2 déjà émis (avant la sortie de la 1re tâche)
+        phase_2 = asyncio.Event()
 
-        if len(tasks) > 0:
+        route = router.route(request, has_image)
+        metrics.counters.update(router.counters())
+        if route is Route.DIRECT:
+            # Aucun outil à planifier : on passe directement à la synthèse
+            metrics.agents[self.agent_data.id] = self.agent_data
+        else:
             yield AgentResponse(
                 metrics=metrics,
                 id=self.agent_data.id,
-                chunk="\n\n**Phase 2 : Exécution du Plan**\n\n",
+                chunk="**Phase 1 : Planification Stratégique**\n\n",
             )
-            yield AgentResponse(
-                metrics=metrics, id=self.agent_data.id, chunk=tasks.render_tasks()
+
+            prompt = f"{history_str}Nouvelle requête à planifier : {request}"
+            if image_url is not None:
+                prompt += f"\nUser uploaded image: {image_url}"
+
+            use_cache = plan_cache.applies(has_history=len(self.history) > 0)
+            cached = (
+                plan_cache.get(request, has_image, self.agent_data.id)
+                if use_cache
+                else None
             )
+            if use_cache:
+                metrics.counters.update(plan_cache.counters())
 
-            for t in tasks:
-                executor = ExecutorAgent(t, image_url)
-                metrics.agents[executor.agent_data.id] = executor.agent_data
+            if EXECUTOR_BATCH:
+                batch = BatchedToolCalls(image_url)
 
-                task_result_accumulated = ""
+            if cached is not None:
+                tasks = cached
+                if batch is not None:
+                    batch.start(tasks, metrics)
+                metrics.agents[self.agent_data.id] = self.agent_data
                 yield AgentResponse(
                     metrics=metrics,
-                    id=executor.agent_data.id,
-                    chunk=f"> *Exécution de la tâche : {t.title}*\n",
+                    id=self.agent_data.id,
+                    chunk="*Plan réutilisé (requête déjà planifiée).*\n",
+                )
+            else:
+                # Les tâches démarrent pendant que le Planner écrit la suite
+                parser = PlanStreamParser()
+                planning = self.stream_plan(
+                    prompt, tasks, metrics, parser, phase_2, batch
                 )
 
-                for response in executor.execute_task(t, tasks, metrics, memory):
-                    task_result_accumulated += response.chunk
-                    yield response
+        memory = MemoryAgent()
+        results = TurnResults(TOOL_RESULT_MAX_CHARS, TOOL_RESULTS_MAX_CHARS)
+        last_agent_ids = [self.agent_data.id]
 
+        if planning is not None or len(tasks) > 0:
+            if planning is None:
+                phase_2.set()
+                yield self.phase_2_header(metrics)
                 yield AgentResponse(
-                    metrics=metrics, id=executor.agent_data.id, chunk="\n\n"
+                    metrics=metrics, id=self.agent_data.id, chunk=tasks.render_tasks()
                 )
-                last_agent_id = executor.agent_data.id
-                self.logs.append(task_result_accumulated)
+
+            scheduler = TaskScheduler(tasks, max_workers=PLAN_MAX_WORKERS)
+            try:
+                async for response in scheduler.run(
+                    lambda t: self.run_task(
+                        t, tasks, metrics, memory, results, image_url, batch
+                    ),
+                    planning=planning,
+                ):
+                    # Une tâche démarrée en plein flux du Planner : la phase 2
+                    # est annoncée avant sa première sortie
+                    if not phase_2.is_set() and response.id != self.agent_data.id:
+                        phase_2.set()
+                        yield self.phase_2_header(metrics)
+                    yield response
+            except PlanningError as e:
+                print(f"Erreur lors de la génération du plan : {e}")
+                return
+            finally:
+                if batch is not None:
+                    batch.close()
+
+            # Seul un tableau JSON complet est mis en cache ; un plan vide
+            # avec image vient d'une sortie ratée, pas d'une requête simple
+            if (
+                parser is not None
+                and parser.closed
+                and use_cache
+                and (len(tasks) > 0 or not has_image)
+            ):
+                plan_cache.set(request, has_image, tasks)
+
+            # Le Réactif dépend des tâches dont aucune autre ne dépend
+            last_agent_ids = [
+                t.step_id for t in tasks if not tasks.dependents[t.step_id]
+            ] or last_agent_ids
 
         # Phase 3 : Toujours exécutée, même si pas de tâches (pour réponse simple)
         yield AgentResponse(
@@ -120,7 +206,7 @@ Format JSON attendu :
             chunk="**Phase 3 : Synthèse et Réponse Finale**\n\n",
         )
         reactive = ReactiveAgent()
-        reactive.agent_data.dependencies = [last_agent_id]
+        reactive.agent_data.dependencies = last_agent_ids
         metrics.agents[reactive.agent_data.id] = reactive.agent_data
 
         final_prompt = f"""
@@ -134,24 +220,97 @@ DERNIÈRE REQUÊTE UTILISATEUR:
 {request}
 
 RÉSULTATS DES TÂCHES (Outils):
-{self.logs if self.logs else "Aucune exécution d'outil."}
+{results.render()}
 
 PLANIFICATION:
 {tasks.render_tasks() if len(tasks) > 0 else "Aucune tâche complexe nécessaire."}
 """
 
         full_reactive_response = ""
-        for response in reactive.ask(final_prompt, metrics):
+        async for response in reactive.ask(final_prompt, metrics):
             full_reactive_response += response.chunk
             yield response
 
         # Save to history
-        self.chat_history.append({"role": "user", "content": request})
-        self.chat_history.append(
-            {"role": "assistant", "content": full_reactive_response}
-        )
+        self.history.add_turn(request, full_reactive_response)
 
         # self.status = Status.FINISHED
         self.agent_data.status = Status.FINISHED
         metrics.agents[self.agent_data.id] = self.agent_data
+        record_span(
+            "plan",
+            plan_started_at,
+            time.perf_counter(),
+            route=route.value,
+            tasks=len(tasks),
+        )
         yield AgentResponse(metrics=metrics, id=self.agent_data.id, chunk="")
+
+    def phase_2_header(self, metrics: AgentsMetrics) -> AgentResponse:
+        return AgentResponse(
+            metrics=metrics,
+            id=self.agent_data.id,
+            chunk="\n\n**Phase 2 : Exécution du Plan**\n\n",
+        )
+
+    async def stream_plan(
+        self,
+        prompt: str,
+        tasks: Tasks,
+        metrics: AgentsMetrics,
+        parser: PlanStreamParser,
+        phase_2: asyncio.Event,
+        batch: Optional[BatchedToolCalls] = None,
+    ) -> AsyncGenerator[AgentResponse, None]:
+        """
+        Flux du Planner ; chaque tâche est ajoutée à `tasks` dès que son
+        objet JSON est complet, pour que le scheduler puisse la lancer.
+        `parser.closed` indique ensuite si le tableau du plan était complet.
+        """
+        try:
+            async for response in self.ask(prompt, metrics):
+                for item in parser.feed(response.chunk):
+                    tasks.add(item)
+                yield response
+        except Exception as e:
+            raise PlanningError(e) from e
+
+        tasks.report()
+        if batch is not None:
+            batch.start(tasks, metrics)
+        if len(tasks) > 0:
+            if not phase_2.is_set():
+                phase_2.set()
+                yield self.phase_2_header(metrics)
+            yield AgentResponse(
+                metrics=metrics, id=self.agent_data.id, chunk=tasks.render_tasks()
+            )
+
+    async def run_task(
+        self,
+        task: PlannedTask,
+        tasks: Tasks,
+        metrics: AgentsMetrics,
+        memory: MemoryAgent,
+        results: TurnResults,
+        image_url: Optional[str],
+        batch: Optional[BatchedToolCalls] = None,
+    ):
+        executor = ExecutorAgent(task, image_url)
+        metrics.agents[executor.agent_data.id] = executor.agent_data
+
+        task_result_accumulated = ""
+        yield AgentResponse(
+            metrics=metrics,
+            id=executor.agent_data.id,
+            chunk=f"> *Exécution de la tâche : {task.title}*\n",
+        )
+
+        async for response in executor.execute_task(
+            task, tasks, metrics, memory, batch
+        ):
+            task_result_accumulated += response.chunk
+            yield response
+
+        yield AgentResponse(metrics=metrics, id=executor.agent_data.id, chunk="\n\n")
+        results.add(task.step_id, task.title, task_result_accumulated)
@@ -24,10 +24,10 @@ TA MISSION:
             system_prompt, AgentType.REACTIVE, model="google/gemma-3-27b-it:free"
         )
 
-    def handle_request(self, request: str, metrics: AgentsMetrics) -> str:
+    async def handle_request(self, request: str, metrics: AgentsMetrics) -> str:
         full_response = ""
         try:
-            for response in self.ask(request, metrics):
+            async for response in self.ask(request, metrics):
                 full_response += response.chunk
             return full_response if full_response else "Error: Empty response."
         except Exception as e:
@@ -1,8 +1,20 @@
+from pathlib import Path
+from typing import Optional
+from src.core.config import (
+    TELEMETRY_BACKEND,
+    TELEMETRY_BATCH_SIZE,
+    TELEMETRY_FLUSH_INTERVAL_MS,
+    TELEMETRY_PATH,
+    TELEMETRY_ROTATE_BYTES,
+    TELEMETRY_ROTATE_SECONDS,
+)
+import atexit
 import csv
+import logging
+import queue
+import sqlite3
+import threading
 import time
-from pathlib import Path
-
-file_path = Path("telemetrics.csv")
 
 csv_header = [
     "timestamp",
@@ -14,26 +26,140 @@ csv_header = [
 ]
 
 
-def append_to_csv(
+class TelemetrySink:
+    """
+    File d'attente de télémétrie vidée par un thread d'écriture.
+    Les lignes sont écrites par lots (TELEMETRY_BATCH_SIZE lignes ou
+    TELEMETRY_FLUSH_INTERVAL_MS), dans un CSV avec rotation par taille/âge
+    ou dans une base SQLite. Aucune requête n'attend l'écriture disque.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        backend: str = "csv",
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        rotate_bytes: int = 0,
+        rotate_seconds: float = 0,
+    ):
+        self.path = path
+        self.backend = backend
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.rows: queue.Queue[Optional[list]] = queue.Queue()
+        self.writer: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+        self.opened_at = time.time()
+
+    def record(self, row: list):
+        self.rows.put(row)
+        if self.writer is None:
+            self.start()
+
+    def start(self):
+        with self.lock:
+            if self.writer is None:
+                self.writer = threading.Thread(target=self.run, daemon=True)
+                self.writer.start()
+
+    def stop(self):
+        """Écrit les lignes en attente puis arrête le thread."""
+        with self.lock:
+            writer, self.writer = self.writer, None
+        if writer is not None:
+            self.rows.put(None)
+            writer.join()
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    row = self.rows.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if row is None:
+                    stopping = True
+                    break
+                batch.append(row)
+
+            if batch:
+                try:
+                    self.write(batch)
+                except Exception as e:
+                    logging.error(f"Failed to write telemetry: {e}")
+
+    def write(self, batch: list[list]):
+        if self.backend == "sqlite":
+            self.write_sqlite(batch)
+        else:
+            self.write_csv(batch)
+
+    def write_csv(self, batch: list[list]):
+        self.rotate()
+        new_file = not self.path.exists()
+        with open(self.path, mode="a", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            if new_file:
+                writer.writerow(csv_header)
+            writer.writerows(batch)
+
+    def rotate(self):
+        if not self.path.exists():
+            return
+        too_big = self.rotate_bytes and self.path.stat().st_size >= self.rotate_bytes
+        too_old = (
+            self.rotate_seconds and time.time() - self.opened_at >= self.rotate_seconds
+        )
+        if too_big or too_old:
+            rotated = self.path.with_name(
+                f"{self.path.stem}.{int(time.time() * 1000)}{self.path.suffix}"
+            )
+            self.path.rename(rotated)
+            self.opened_at = time.time()
+
+    def write_sqlite(self, batch: list[list]):
+        with sqlite3.connect(self.path) as db:
+            db.execute(
+                f"CREATE TABLE IF NOT EXISTS telemetry ({', '.join(csv_header)})"
+            )
+            db.executemany(
+                f"INSERT INTO telemetry VALUES ({', '.join('?' * len(csv_header))})",
+                batch,
+            )
+
+
+sink = TelemetrySink(
+    Path(TELEMETRY_PATH),
+    backend=TELEMETRY_BACKEND,
+    batch_size=TELEMETRY_BATCH_SIZE,
+    flush_interval=TELEMETRY_FLUSH_INTERVAL_MS / 1000,
+    rotate_bytes=TELEMETRY_ROTATE_BYTES,
+    rotate_seconds=TELEMETRY_ROTATE_SECONDS,
+)
+# Hors du lifespan FastAPI (scripts, tests), on vide quand même la file
+atexit.register(sink.stop)
+
+
+def record_telemetry(
     model_kind: str,
     model_name: str,
     input_tokens: float,
     output_tokens: float,
     time_taken: float,
 ):
-    data_row = [
-        time.time(),
-        model_kind,
-        model_name,
-        input_tokens,
-        output_tokens,
-        time_taken,
-    ]
-    if not file_path.exists():
-        with open(file_path, mode="w", newline="", encoding="utf-8") as file:
-            writer = csv.writer(file)
-            writer.writerow(csv_header)
-
-    with open(file_path, mode="a", newline="", encoding="utf-8") as file:
-        writer = csv.writer(file)
-        writer.writerow(data_row)
+    sink.record(
+        [
+            time.time(),
+            model_kind,
+            model_name,
+            input_tokens,
+            output_tokens,
+            time_taken,
+        ]
+    )
@@ -1,13 +1,22 @@
-import base64
+import asyncio
 import os
-import mimetypes
 import time
-from typing import Generator
+from typing import AsyncGenerator, Optional
 from src.agents.agent import Agent, AgentResponse
 from src.core.models import AgentType, AgentsMetrics
+from src.core.tracing import span
+from src.tools.images import prepare_image
 from openrouter import components
 
 
+def resolve_image_path(image_path: str) -> str:
+    if image_path.startswith("/static"):
+        base_dir = os.path.dirname(os.path.abspath(__file__))  # back/src/agents
+        project_back_dir = os.path.abspath(os.path.join(base_dir, "../../"))  # back/
+        return os.path.join(project_back_dir, image_path.lstrip("/"))
+    return image_path
+
+
 class VisionAgent(Agent):
     def __init__(self):
         system_prompt = """
@@ -21,23 +30,20 @@ INSTRUCTIONS:
 4. S'il y a une image, tu dois arrêter ton execution si l'image n'est pas une image médicale pertinente. (ex: mammographie, radiographie)S'il y a une image, tu dois arrêter ton execution si l'image n'est pas une image médicale pertinente. (ex: mammographie, radiographie)
 """
         super().__init__(system_prompt, AgentType.VISION, model="google/gemma-3-27b-it")
+        # Vrai si le dernier `analyze` a échoué, même après un début de réponse
+        self.failed = False
 
-    def analyze(
+    async def analyze(
         self, instruction: str, image_path: str, metrics: AgentsMetrics
-    ) -> Generator[AgentResponse, None, None]:
+    ) -> AsyncGenerator[AgentResponse, None]:
         self.reset_id()
+        self.failed = False
         metrics.agents[self.agent_data.id] = self.agent_data
 
-        # Path resolution
-        real_path = image_path
-        if image_path.startswith("/static"):
-            base_dir = os.path.dirname(os.path.abspath(__file__))  # back/src/agents
-            project_back_dir = os.path.abspath(
-                os.path.join(base_dir, "../../")
-            )  # back/
-            real_path = os.path.join(project_back_dir, image_path.lstrip("/"))
+        real_path = resolve_image_path(image_path)
 
         if not os.path.exists(real_path):
+            self.failed = True
             yield AgentResponse(
                 metrics=metrics,
                 id=self.agent_data.id,
@@ -46,14 +52,10 @@ INSTRUCTIONS:
             return
 
         try:
-            mime_type, _ = mimetypes.guess_type(real_path)
-            if not mime_type:
-                mime_type = "image/jpeg"
-
-            with open(real_path, "rb") as image_file:
-                encoded_string = base64.b64encode(image_file.read()).decode("utf-8")
-                image_data_url = f"data:{mime_type};base64,{encoded_string}"
+            with span("vision.prepare_image", path=real_path):
+                image_data_url = await asyncio.to_thread(prepare_image, real_path)
         except Exception as e:
+            self.failed = True
             yield AgentResponse(
                 metrics=metrics,
                 id=self.agent_data.id,
@@ -77,17 +79,20 @@ INSTRUCTIONS:
         base_time_taken = self.agent_data.time_taken
 
         try:
-            stream = self.client.chat.send(
+            sent_at = time.perf_counter()
+            stream = await self.client.chat.send_async(
                 model=self.model,
                 messages=messages,
                 stream=True,
                 stream_options=components.ChatStreamOptions(include_usage=True),
             )
+            connected_at = time.perf_counter()
+            first_token_at: Optional[float] = None
 
             start_time = time.time()
             current_output_tokens = 0
 
-            for event in stream:
+            async for event in stream:
                 request_duration = time.time() - start_time
                 self.agent_data.time_taken = base_time_taken + request_duration
 
@@ -109,6 +114,8 @@ INSTRUCTIONS:
 
                 chunk = event.choices[0].delta.content
                 if chunk:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
                     current_output_tokens += 1
                     self.agent_data.output_token_count = (
                         base_output_tokens + current_output_tokens
@@ -118,9 +125,16 @@ INSTRUCTIONS:
                         metrics=metrics, id=self.agent_data.id, chunk=chunk
                     )
 
+            self.record_generation(
+                sent_at,
+                connected_at,
+                first_token_at,
+                self.agent_data.output_token_count - base_output_tokens,
+            )
             metrics.agents[self.agent_data.id] = self.agent_data
 
         except Exception as e:
+            self.failed = True
             yield AgentResponse(
                 metrics=metrics,
                 id=self.agent_data.id,
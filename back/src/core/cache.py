@@ -0,0 +1,132 @@
+from collections import OrderedDict
+from typing import Optional
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_key(*parts: str) -> str:
+    """Clé stable à partir de plusieurs composants (hash, instruction, modèle...)."""
+    return hash_bytes("\0".join(parts).encode())
+
+
+class ResultCache:
+    """
+    Cache LRU de résultats textuels, borné en nombre d'entrées et en octets.
+    Avec `db_path`, les entrées sont aussi écrites dans SQLite et survivent
+    aux redémarrages : un défaut en mémoire est relu depuis le disque.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        max_entries: int = 256,
+        max_bytes: int = 16 * 1024 * 1024,
+        db_path: Optional[str] = None,
+    ):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[str, str] = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self.db = sqlite3.connect(db_path, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                """CREATE TABLE IF NOT EXISTS cache (
+                    namespace TEXT, key TEXT, value TEXT, accessed_at REAL,
+                    PRIMARY KEY (namespace, key))"""
+            )
+            self.db.commit()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+            value = self.load(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.store(key, value)
+            return value
+
+    def set(self, key: str, value: str):
+        with self.lock:
+            self.store(key, value)
+            self.save(key, value)
+
+    def store(self, key: str, value: str):
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous)
+        if len(value) > self.max_bytes:
+            return
+        self.entries[key] = value
+        self.size += len(value)
+        while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def load(self, key: str) -> Optional[str]:
+        if self.db is None:
+            return None
+        try:
+            row = self.db.execute(
+                "SELECT value FROM cache WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is not None:
+                self.db.execute(
+                    "UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                    (time.time(), self.namespace, key),
+                )
+                self.db.commit()
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            logging.error(f"Cache read failed ({self.namespace}): {e}")
+            return None
+
+    def save(self, key: str, value: str):
+        if self.db is None:
+            return
+        try:
+            self.db.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                (self.namespace, key, value, time.time()),
+            )
+            # Même borne sur disque : on garde les entrées les plus récentes
+            self.db.execute(
+                """DELETE FROM cache WHERE namespace = ? AND key NOT IN (
+                    SELECT key FROM cache WHERE namespace = ?
+                    ORDER BY accessed_at DESC LIMIT ?)""",
+                (self.namespace, self.namespace, self.max_entries),
+            )
+            self.db.commit()
+        except sqlite3.Error as e:
+            logging.error(f"Cache write failed ({self.namespace}): {e}")
@@ -0,0 +1,142 @@
+from typing import Optional
+from dotenv import dotenv_values
+import os
+
+config = dotenv_values(".env")
+
+# Dossier back/, indépendant du répertoire courant
+BACK_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+
+
+def get_setting(name: str, default: Optional[str] = None) -> Optional[str]:
+    """Lit un paramètre dans le .env, puis dans l'environnement."""
+    value = config.get(name) or os.environ.get(name)
+    return value if value else default
+
+
+def get_int_setting(name: str, default: int) -> int:
+    value = get_setting(name)
+    return int(value) if value else default
+
+
+def get_float_setting(name: str, default: float) -> float:
+    value = get_setting(name)
+    return float(value) if value else default
+
+
+def get_bool_setting(name: str, default: bool) -> bool:
+    value = get_setting(name)
+    return value.lower() in ("1", "true", "yes", "on") if value else default
+
+
+OPENROUTER_API_KEY = get_setting("OPENROUTER_API_KEY")
+# Autre serveur compatible (ex: bench/mock_openrouter.py pour les mesures)
+OPENROUTER_BASE_URL = get_setting("OPENROUTER_BASE_URL")
+
+# Pool de connexions HTTP partagé vers OpenRouter
+OPENROUTER_MAX_CONNECTIONS = get_int_setting("OPENROUTER_MAX_CONNECTIONS", 100)
+OPENROUTER_MAX_KEEPALIVE_CONNECTIONS = get_int_setting(
+    "OPENROUTER_MAX_KEEPALIVE_CONNECTIONS", 20
+)
+OPENROUTER_KEEPALIVE_EXPIRY = get_float_setting("OPENROUTER_KEEPALIVE_EXPIRY", 60.0)
+
+# Nombre maximum de tâches du plan exécutées en parallèle
+PLAN_MAX_WORKERS = get_int_setting("PLAN_MAX_WORKERS", 4)
+
+# Regroupement des chunks du flux /chat (0 pour désactiver)
+STREAM_FLUSH_INTERVAL_MS = get_int_setting("STREAM_FLUSH_INTERVAL_MS", 30)
+STREAM_FLUSH_BYTES = get_int_setting("STREAM_FLUSH_BYTES", 1024)
+
+# Modèle de classification : chemin local épinglé, chargé au démarrage
+CLASSIFICATION_MODEL_PATH = get_setting("CLASSIFICATION_MODEL_PATH") or os.path.join(
+    BACK_DIR, "data", "models", "cnn_rnn_model_1.h5"
+)
+CLASSIFICATION_PRELOAD = get_bool_setting("CLASSIFICATION_PRELOAD", True)
+
+# Micro-batching des inférences de classification
+CLASSIFICATION_BATCH_SIZE = get_int_setting("CLASSIFICATION_BATCH_SIZE", 16)
+CLASSIFICATION_BATCH_WAIT_MS = get_int_setting("CLASSIFICATION_BATCH_WAIT_MS", 10)
+
+# Cache des résultats d'outils (clé : SHA-256 de l'image)
+RESULT_CACHE_SIZE = get_int_setting("RESULT_CACHE_SIZE", 256)
+RESULT_CACHE_MAX_BYTES = get_int_setting("RESULT_CACHE_MAX_MB", 16) * 1024 * 1024
+# Fichier SQLite pour conserver le cache entre redémarrages (vide : mémoire seule)
+RESULT_CACHE_DB = get_setting("RESULT_CACHE_DB")
+
+# Préparation des images envoyées au modèle de vision
+VISION_MAX_EDGE = get_int_setting("VISION_MAX_EDGE", 1024)
+VISION_IMAGE_FORMAT = (get_setting("VISION_IMAGE_FORMAT") or "JPEG").upper()
+VISION_IMAGE_QUALITY = get_int_setting("VISION_IMAGE_QUALITY", 85)
+# Niveaux de gris pour les images déjà (quasi) monochromes, pas les photos couleur
+VISION_GRAYSCALE = get_bool_setting("VISION_GRAYSCALE", True)
+VISION_IMAGE_CACHE_BYTES = get_int_setting("VISION_IMAGE_CACHE_MB", 64) * 1024 * 1024
+
+# Télémétrie : écrite en arrière-plan, en CSV (avec rotation) ou en SQLite
+TELEMETRY_BACKEND = (get_setting("TELEMETRY_BACKEND") or "csv").lower()
+TELEMETRY_PATH = get_setting("TELEMETRY_PATH") or os.path.join(
+    BACK_DIR, "telemetrics.db" if TELEMETRY_BACKEND == "sqlite" else "telemetrics.csv"
+)
+TELEMETRY_BATCH_SIZE = get_int_setting("TELEMETRY_BATCH_SIZE", 100)
+TELEMETRY_FLUSH_INTERVAL_MS = get_int_setting("TELEMETRY_FLUSH_INTERVAL_MS", 1000)
+TELEMETRY_ROTATE_BYTES = get_int_setting("TELEMETRY_ROTATE_MB", 0) * 1024 * 1024
+TELEMETRY_ROTATE_SECONDS = get_int_setting("TELEMETRY_ROTATE_HOURS", 0) * 3600
+
+# Sessions de chat : expiration, éviction LRU et persistance SQLite optionnelle
+SESSION_MAX_COUNT = get_int_setting("SESSION_MAX_COUNT", 1000)
+SESSION_IDLE_TTL = get_int_setting("SESSION_IDLE_TTL_MINUTES", 60) * 60
+SESSION_MAX_BYTES = get_int_setting("SESSION_MAX_MB", 256) * 1024 * 1024
+# Une session expirée ou évincée est relue depuis SQLite au lieu d'être perdue
+SESSION_DB = get_setting("SESSION_DB") or os.path.join(BACK_DIR, "data", "sessions.db")
+# Plusieurs workers / conteneurs : l'état des sessions est partagé via SQLite
+SESSION_SHARED = get_bool_setting("SESSION_SHARED", False)
+
+# Historique de conversation : budget en tokens et tours gardés verbatim
+HISTORY_MAX_TOKENS = get_int_setting("HISTORY_MAX_TOKENS", 2000)
+HISTORY_KEEP_TURNS = get_int_setting("HISTORY_KEEP_TURNS", 3)
+
+# Résultats d'outils transmis au Réactif (par résultat, et pour le tour)
+TOOL_RESULT_MAX_CHARS = get_int_setting("TOOL_RESULT_MAX_CHARS", 2000)
+TOOL_RESULTS_MAX_CHARS = get_int_setting("TOOL_RESULTS_MAX_CHARS", 6000)
+
+# Cache de plans : "off", "first_turn" (sans historique) ou "always"
+PLAN_CACHE_POLICY = (get_setting("PLAN_CACHE_POLICY") or "first_turn").lower()
+PLAN_CACHE_TTL = get_int_setting("PLAN_CACHE_TTL_MINUTES", 60) * 60
+PLAN_CACHE_SIZE = get_int_setting("PLAN_CACHE_SIZE", 512)
+
+# Aiguillage local des messages simples directement vers le Réactif
+ROUTER_ENABLED = get_bool_setting("ROUTER_ENABLED", True)
+ROUTER_TOOL_THRESHOLD = get_float_setting("ROUTER_TOOL_THRESHOLD", 1.5)
+ROUTER_MAX_WORDS = get_int_setting("ROUTER_MAX_WORDS", 12)
+
+# Analyse spéculative des images dès l'upload (classification ; en option, une
+# description générique servie à une tâche vision de description/pertinence)
+PREFETCH_ENABLED = get_bool_setting("PREFETCH_ENABLED", False)
+PREFETCH_VISION = get_bool_setting("PREFETCH_VISION", False)
+PREFETCH_VISION_INSTRUCTION = (
+    get_setting("PREFETCH_VISION_INSTRUCTION") or "Décris cette image médicale."
+)
+PREFETCH_TTL = get_int_setting("PREFETCH_TTL_SECONDS", 300)
+
+# Uploads : taille maximale et types acceptés. Les DICOM arrivent souvent en
+# application/octet-stream ; ils sont envoyés bruts à la vision (images.py)
+UPLOAD_MAX_BYTES = get_int_setting("UPLOAD_MAX_MB", 20) * 1024 * 1024
+UPLOAD_ALLOWED_TYPES = [
+    t.strip()
+    for t in (
+        get_setting("UPLOAD_ALLOWED_TYPES")
+        or "image/png,image/jpeg,image/webp,image/bmp,image/tiff,"
+        "application/dicom,application/octet-stream"
+    ).split(",")
+]
+
+# Appel d'outil sans LLM quand la tâche désigne clairement son outil
+DIRECT_TOOL_DISPATCH = get_bool_setting("DIRECT_TOOL_DISPATCH", True)
+
+# Un seul appel à l'Exécuteur pour résoudre les outils de tout le plan
+EXECUTOR_BATCH = get_bool_setting("EXECUTOR_BATCH", False)
+
+# Tracing des requêtes /chat (format Chrome Trace Event, Perfetto)
+TRACING_ENABLED = get_bool_setting("TRACING_ENABLED", False)
+TRACE_DIR = get_setting("TRACE_DIR") or os.path.join(BACK_DIR, "data", "traces")
+# Résumé des durées par catégorie dans le dernier chunk du flux
+TRACE_SUMMARY = get_bool_setting("TRACE_SUMMARY", False)
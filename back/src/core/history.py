@@ -0,0 +1,125 @@
+from typing import Any, Dict, List, Optional
+import re
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    # Approximation suffisante pour un budget : ~4 caractères par token
+    return len(text) // 4 + 1
+
+
+def first_sentences(text: str, max_chars: int) -> str:
+    """Résumé extractif : les premières phrases, dans la limite de max_chars."""
+    text = " ".join(text.split())
+    summary = ""
+    for sentence in _SENTENCE_END.split(text):
+        if summary and len(summary) + len(sentence) + 1 > max_chars:
+            break
+        summary = f"{summary} {sentence}".strip()
+    if len(summary) > max_chars:
+        summary = summary[: max_chars - 1].rstrip() + "…"
+    return summary
+
+
+class ConversationHistory:
+    """
+    Historique de conversation borné en tokens.
+    Les `keep_turns` derniers tours restent verbatim ; les plus anciens sont
+    compressés, une seule fois, dans un résumé glissant. Le préfixe de
+    prompt est mis en cache et ne change qu'à l'ajout d'un tour.
+    """
+
+    def __init__(self, max_tokens: int = 2000, keep_turns: int = 3):
+        self.max_tokens = max_tokens
+        self.keep_turns = max(1, keep_turns)
+        self.turns: List[Dict[str, str]] = []  # tours gardés verbatim
+        self.summary_lines: List[str] = []
+        self.summary_tokens = 0
+        self.rendered: Optional[str] = None
+
+    def __len__(self):
+        return len(self.turns)
+
+    def add_turn(self, user: str, assistant: str):
+        self.turns.append({"user": user, "assistant": assistant})
+        self.compact()
+        self.rendered = None
+
+    def compact(self):
+        verbatim_tokens = sum(self.turn_tokens(turn) for turn in self.turns)
+        while len(self.turns) > self.keep_turns or (
+            len(self.turns) > 1 and verbatim_tokens > self.max_tokens // 2
+        ):
+            turn = self.turns.pop(0)
+            verbatim_tokens -= self.turn_tokens(turn)
+            self.summarize(turn)
+
+        # Le dernier tour reste verbatim, mais une réponse trop longue est
+        # raccourcie pour que le budget tienne quand même
+        if self.turns and verbatim_tokens > self.max_tokens // 2:
+            turn = self.turns[-1]
+            verbatim_tokens -= self.turn_tokens(turn)
+            self.turns[-1] = turn = self.shorten(turn, self.max_tokens // 2)
+            verbatim_tokens += self.turn_tokens(turn)
+
+        # Le résumé prend le reste du budget ; les plus vieilles lignes partent
+        budget = max(0, self.max_tokens - verbatim_tokens)
+        while self.summary_lines and self.summary_tokens > budget:
+            self.summary_tokens -= estimate_tokens(self.summary_lines.pop(0))
+
+    def summarize(self, turn: Dict[str, str]):
+        line = (
+            f"- Utilisateur: {first_sentences(turn['user'], 200)} "
+            f"/ Assistant: {first_sentences(turn['assistant'], 300)}"
+        )
+        self.summary_lines.append(line)
+        self.summary_tokens += estimate_tokens(line)
+
+    @staticmethod
+    def shorten(turn: Dict[str, str], max_tokens: int) -> Dict[str, str]:
+        """Tronque un tour à ~max_tokens (un quart pour la question)."""
+        max_chars = max(4, (max_tokens - 2) * 4)
+        user = first_sentences(turn["user"], max_chars // 4)
+        assistant = first_sentences(turn["assistant"], max_chars - len(user))
+        return {"user": user, "assistant": assistant}
+
+    @staticmethod
+    def turn_tokens(turn: Dict[str, str]) -> int:
+        return estimate_tokens(turn["user"]) + estimate_tokens(turn["assistant"])
+
+    def render(self) -> str:
+        if self.rendered is not None:
+            return self.rendered
+
+        history_str = ""
+        if self.summary_lines:
+            history_str += "RÉSUMÉ DES ÉCHANGES PLUS ANCIENS :\n"
+            history_str += "\n".join(self.summary_lines) + "\n\n"
+        if self.turns:
+            history_str += "HISTORIQUE DE LA CONVERSATION PRÉCÉDENTE :\n"
+            for turn in self.turns:
+                history_str += f"- Utilisateur: {turn['user']}\n"
+                history_str += f"- Assistant: {turn['assistant']}\n"
+            history_str += "\n"
+        self.rendered = history_str
+        return history_str
+
+    def export_state(self) -> Dict[str, Any]:
+        return {"turns": self.turns, "summary_lines": self.summary_lines}
+
+    def load_state(self, state: Dict[str, Any]):
+        self.turns = state.get("turns", [])
+        self.summary_lines = state.get("summary_lines", [])
+        self.summary_tokens = sum(estimate_tokens(line) for line in self.summary_lines)
+        self.rendered = None
+
+    @classmethod
+    def from_messages(
+        cls, messages: List[Dict[str, str]], max_tokens: int, keep_turns: int
+    ) -> "ConversationHistory":
+        """Reprend un ancien `chat_history` (liste de messages user/assistant)."""
+        history = cls(max_tokens, keep_turns)
+        for user, assistant in zip(messages[::2], messages[1::2]):
+            history.add_turn(user["content"], assistant["content"])
+        return history
@@ -26,11 +26,15 @@ class AgentData(BaseModel):
     input_token_count: float = 0.0
     output_token_count: float = 0.0
     time_taken: float = 0.0
+    ttft: float = 0.0  # in seconds, last call
+    tokens_per_second: float = 0.0  # last call, after the first token
 
 
 class AgentsMetrics(BaseModel):
     agents: Dict[str, AgentData] = {}
     total_time: float = 0.0  # in seconds
+    counters: Dict[str, int] = {}  # compteurs du processus (caches, routage...)
+    trace: Dict[str, float] = {}  # ms par catégorie de span (TRACE_SUMMARY)
 
 
 class AgentResponse(BaseModel):
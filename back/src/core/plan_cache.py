@@ -0,0 +1,59 @@
+from typing import Dict, Optional
+from .cache import ResultCache, make_key
+from .task import Tasks
+import json
+import re
+import time
+import unicodedata
+
+
+def normalize_request(request: str) -> str:
+    """Minuscules, sans accents ni ponctuation, espaces normalisés."""
+    text = unicodedata.normalize("NFKD", request.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+class PlanCache:
+    """
+    Plans déjà produits par le Planner, par requête normalisée et présence
+    d'une image. Politiques : "off", "first_turn" (seulement sans historique,
+    où la requête suffit à déterminer le plan) ou "always".
+    """
+
+    def __init__(self, policy: str = "first_turn", ttl: float = 3600, size: int = 512):
+        self.policy = policy
+        self.ttl = ttl
+        self.cache = ResultCache("plan", size)
+        self.hits = 0
+        self.misses = 0
+
+    def applies(self, has_history: bool) -> bool:
+        if self.policy == "always":
+            return True
+        return self.policy == "first_turn" and not has_history
+
+    @staticmethod
+    def key(request: str, has_image: bool) -> str:
+        return make_key(normalize_request(request), str(has_image))
+
+    def get(self, request: str, has_image: bool, default_dep: str) -> Optional[Tasks]:
+        entry = self.cache.get(self.key(request, has_image))
+        if entry is not None:
+            cached = json.loads(entry)
+            if time.time() - cached["created_at"] <= self.ttl:
+                self.hits += 1
+                return Tasks(cached["template"], default_dep)
+
+        self.misses += 1
+        return None
+
+    def set(self, request: str, has_image: bool, tasks: Tasks):
+        if tasks.errors():
+            return
+        entry = {"template": tasks.to_template(), "created_at": time.time()}
+        self.cache.set(self.key(request, has_image), json.dumps(entry))
+
+    def counters(self) -> Dict[str, int]:
+        return {"plan_cache_hits": self.hits, "plan_cache_misses": self.misses}
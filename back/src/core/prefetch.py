@@ -0,0 +1,63 @@
+from typing import Any, Coroutine, Dict, Optional
+from .cache import make_key
+import asyncio
+import logging
+
+
+class SpeculativePrefetch:
+    """
+    Travaux lancés par anticipation (ex: classification d'une image dès son
+    upload). Un appel identique peut ensuite réclamer le résultat, terminé
+    ou encore en cours ; un travail non réclamé sous `ttl` secondes est
+    annulé et oublié.
+    """
+
+    def __init__(self, ttl: float = 300):
+        self.ttl = ttl
+        self.pending: Dict[str, tuple[asyncio.Task, asyncio.TimerHandle]] = {}
+        self.used = 0
+        self.discarded = 0
+
+    def __len__(self):
+        return len(self.pending)
+
+    def start(self, coro: Coroutine[Any, Any, Any], *key_parts: str):
+        key = make_key(*key_parts)
+        if key in self.pending:
+            coro.close()
+            return
+        task = asyncio.create_task(coro)
+        task.add_done_callback(self.log_failure)
+        timer = asyncio.get_running_loop().call_later(self.ttl, self.expire, key)
+        self.pending[key] = (task, timer)
+
+    def claim(self, *key_parts: str) -> Optional[asyncio.Task]:
+        entry = self.pending.pop(make_key(*key_parts), None)
+        if entry is None:
+            return None
+        task, timer = entry
+        timer.cancel()
+        self.used += 1
+        return task
+
+    def expire(self, key: str):
+        entry = self.pending.pop(key, None)
+        if entry is not None:
+            entry[0].cancel()
+            self.discarded += 1
+
+    def cancel_all(self):
+        for key in list(self.pending):
+            self.expire(key)
+
+    @staticmethod
+    def log_failure(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"Speculative task failed: {task.exception()}")
+
+    def counters(self) -> Dict[str, int]:
+        return {
+            "prefetch_pending": len(self.pending),
+            "prefetch_used": self.used,
+            "prefetch_discarded": self.discarded,
+        }
@@ -0,0 +1,60 @@
+from dataclasses import dataclass
+from typing import List
+from .history import first_sentences
+
+
+@dataclass
+class TaskResult:
+    step_id: str
+    title: str
+    content: str
+
+
+class TurnResults:
+    """
+    Résultats des tâches d'un seul tour, pour la synthèse du Réactif.
+    Chaque résultat est borné à `max_chars` (résumé extractif au-delà), et
+    l'ensemble à `max_total_chars`, partagé équitablement entre les tâches.
+    """
+
+    def __init__(self, max_chars: int = 2000, max_total_chars: int = 6000):
+        self.max_chars = max_chars
+        self.max_total_chars = max_total_chars
+        self.results: List[TaskResult] = []
+
+    def __len__(self):
+        return len(self.results)
+
+    def add(self, step_id: str, title: str, content: str):
+        content = content.strip()
+        self.results.append(
+            TaskResult(step_id, title, shorten(content, self.max_chars))
+        )
+
+    def budgets(self) -> List[int]:
+        # Partage du budget total : les petits résultats cèdent leur reste
+        sizes = [len(result.content) for result in self.results]
+        budgets = [0] * len(sizes)
+        remaining = self.max_total_chars
+        for count, index in enumerate(sorted(range(len(sizes)), key=sizes.__getitem__)):
+            share = remaining // (len(sizes) - count)
+            budgets[index] = min(sizes[index], share)
+            remaining -= budgets[index]
+        return budgets
+
+    def render(self) -> str:
+        if not self.results:
+            return "Aucune exécution d'outil."
+
+        blocks = []
+        for result, budget in zip(self.results, self.budgets()):
+            blocks.append(
+                f"[{result.step_id}] {result.title}\n{shorten(result.content, budget)}"
+            )
+        return "\n\n".join(blocks)
+
+
+def shorten(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    return first_sentences(text, max(1, max_chars - 6)) + " […]"
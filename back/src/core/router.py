@@ -0,0 +1,153 @@
+from enum import Enum
+from typing import Dict, Optional
+from .plan_cache import normalize_request
+import re
+
+
+class Route(Enum):
+    PLANNER = "planner"  # plan + exécution des outils + synthèse
+    DIRECT = "direct"  # réponse directe du Réactif
+
+
+# Formules de politesse : aucune tâche possible, quel que soit le contexte
+SMALL_TALK = re.compile(
+    r"^(bonjour|bonsoir|salut|coucou|hello|hi|hey|merci|thanks|thank you|ok|"
+    r"okay|d accord|parfait|super|top|genial|au revoir|a bientot|bye|"
+    r"bonne (journee|soiree|nuit)|comment (vas tu|allez vous|ca va)|ca va)\b"
+)
+
+# Petit modèle linéaire : poids des racines qui appellent un outil
+# (vision_tool, classification_tool). Au-delà du seuil, le Planner décide.
+TOOL_WEIGHTS = {
+    "image": 2.0,
+    "photo": 2.0,
+    "cliche": 2.0,
+    "mammo": 3.0,
+    "radio": 3.0,
+    "scan": 2.0,
+    "echo": 2.0,
+    "irm": 3.0,
+    "classif": 3.0,
+    "analys": 1.5,
+    "examin": 1.5,
+    "regard": 1.0,
+    "decri": 1.0,
+    "malin": 2.0,
+    "benin": 2.0,
+    "tumeur": 1.5,
+    "masse": 1.5,
+    "lesion": 1.5,
+    "nodule": 1.5,
+    "diagnost": 1.0,
+}
+
+
+class RequestRouter:
+    """
+    Aiguillage local, sans appel LLM, devant le Planner. Les formules de
+    politesse courtes et les questions simples sans rapport avec les outils
+    partent directement au Réactif ; dans le doute, le Planner décide.
+    """
+
+    def __init__(
+        self, enabled: bool = True, threshold: float = 1.5, max_words: int = 12
+    ):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.max_words = max_words
+        self.counts: Dict[Route, int] = {route: 0 for route in Route}
+
+    @staticmethod
+    def tool_score(words: list[str]) -> float:
+        return sum(
+            weight
+            for word in words
+            for stem, weight in TOOL_WEIGHTS.items()
+            if word.startswith(stem)
+        )
+
+    def classify(self, request: str, has_image: bool) -> Route:
+        if not self.enabled:
+            return Route.PLANNER
+
+        text = normalize_request(request)
+        words = text.split()
+        if not words:
+            return Route.DIRECT
+        if len(words) <= 6 and SMALL_TALK.match(text):
+            if self.tool_score(words) == 0:
+                return Route.DIRECT
+
+        # Une image jointe ou une requête longue relève du Planner
+        if has_image or len(words) > self.max_words:
+            return Route.PLANNER
+        if self.tool_score(words) < self.threshold:
+            return Route.DIRECT
+        return Route.PLANNER
+
+    def route(self, request: str, has_image: bool) -> Route:
+        route = self.classify(request, has_image)
+        self.counts[route] += 1
+        return route
+
+    def counters(self) -> Dict[str, int]:
+        return {f"route_{route.value}": count for route, count in self.counts.items()}
+
+
+# Racines qui désignent sans ambiguïté un outil d'image du registre
+TOOL_KEYWORDS = {
+    "classification_tool": ("classif", "malin", "benin", "cancereu"),
+    "vision_tool": ("decri", "descri", "vision", "visuel", "observ", "pertinen"),
+}
+
+
+def match_tool(text: str) -> Optional[str]:
+    """
+    Outil désigné par la description d'une tâche, seulement si un seul outil
+    correspond et qu'aucune variable ($step_id) n'est à résoudre ; sinon
+    None, et l'Exécuteur LLM choisit.
+    """
+    if "$" in text:
+        return None
+    words = normalize_request(text).split()
+    matches = [
+        tool
+        for tool, stems in TOOL_KEYWORDS.items()
+        if any(word.startswith(stem) for word in words for stem in stems)
+    ]
+    return matches[0] if len(matches) == 1 else None
+
+
+# Demande de description générale ou de contrôle de pertinence de l'image,
+# sans constat précis à rechercher (masse, calcifications, quadrant...)
+GENERIC_VISION_STEMS = ("decri", "descri", "pertinen", "verifi", "medical", "type")
+SPECIFIC_FINDING_STEMS = (
+    "masse",
+    "lesion",
+    "nodul",
+    "calcif",
+    "microcalc",
+    "tumeur",
+    "kyste",
+    "quadrant",
+    "contour",
+    "bord",
+    "densit",
+    "taille",
+    "mesur",
+    "asymetr",
+    "gauche",
+    "droit",
+    "superieur",
+    "inferieur",
+    "extern",
+    "intern",
+)
+
+
+def is_generic_vision(instruction: str) -> bool:
+    """Vrai si la description générique de l'image répond à l'instruction."""
+    words = normalize_request(instruction).split()
+    if not any(word.startswith(GENERIC_VISION_STEMS) for word in words):
+        return False
+    return not any(word.startswith(SPECIFIC_FINDING_STEMS) for word in words)
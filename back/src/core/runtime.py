@@ -0,0 +1,59 @@
+from typing import Dict, Optional
+import asyncio
+import os
+import resource
+import threading
+import time
+
+
+class LoopMonitor:
+    """
+    Mesure le retard de la boucle asyncio : une tâche dort `interval`
+    secondes et note de combien son réveil est en retard. Un retard qui
+    grandit signale du travail bloquant sur la boucle ou sa saturation.
+    """
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def run(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, time.monotonic() - start - self.interval)
+            self.max_lag = max(self.max_lag, self.lag)
+
+    def stats(self) -> Dict[str, float]:
+        return {"loop_lag_ms": self.lag * 1000, "loop_max_lag_ms": self.max_lag * 1000}
+
+
+def rss_bytes() -> int:
+    """Mémoire résidente actuelle (Linux), sinon le pic du processus."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss est en Ko sous Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def process_stats() -> Dict[str, float]:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return {
+        "pid": os.getpid(),
+        "cpu_seconds": usage.ru_utime + usage.ru_stime,
+        "rss_bytes": rss_bytes(),
+        "threads": threading.active_count(),
+    }
@@ -0,0 +1,112 @@
+from typing import AsyncGenerator, AsyncIterator, Callable, Optional, TypeVar
+from .task import PlannedTask, Tasks
+from .tracing import record_span, set_lane
+import asyncio
+import time
+
+T = TypeVar("T")
+
+_DONE = object()
+_PLAN_DONE = object()
+
+
+class TaskScheduler:
+    """
+    Exécute les tâches d'un plan en suivant leur DAG de dépendances.
+    Chaque tâche démarre dès que ses dépendances sont terminées, et les
+    flux produits par les tâches en cours sont fusionnés en un seul.
+
+    Avec `planning`, le plan arrive pendant l'exécution : ce flux (celui du
+    Planner) est relayé tel quel et complète `tasks` au fil de l'eau. Une
+    tâche dont toutes les dépendances sont connues et terminées démarre sans
+    attendre la fin du plan ; les autres attendent, et les tâches en cycle
+    ou à dépendance inexistante ne sont lancées (puis bloquées par
+    l'Executor) qu'une fois le plan complet.
+    """
+
+    def __init__(self, tasks: Tasks, max_workers: int = 4):
+        self.tasks = tasks
+        self.max_workers = max(1, max_workers)
+
+    async def run(
+        self,
+        run_task: Callable[[PlannedTask], AsyncIterator[T]],
+        planning: Optional[AsyncIterator[T]] = None,
+    ) -> AsyncGenerator[T, None]:
+        events: asyncio.Queue = asyncio.Queue()
+        workers = asyncio.Semaphore(self.max_workers)
+
+        async def worker(task: PlannedTask):
+            set_lane(f"task {task.step_id}")
+            queued_at = time.perf_counter()
+            try:
+                async with workers:
+                    record_span("scheduler.queue", queued_at, time.perf_counter())
+                    async for item in run_task(task):
+                        events.put_nowait((task, item))
+            except Exception as e:
+                events.put_nowait((task, e))
+            finally:
+                events.put_nowait((task, _DONE))
+
+        async def planner(stream: AsyncIterator[T]):
+            set_lane("planner")
+            try:
+                async for item in stream:
+                    events.put_nowait((None, item))
+            except Exception as e:
+                events.put_nowait((None, e))
+            finally:
+                events.put_nowait((None, _PLAN_DONE))
+
+        tasks = self.tasks
+        plan_done = planning is None
+        finished: set[str] = set()
+        running: dict[str, asyncio.Task] = {}
+        started: set[str] = set()
+        known = 0
+
+        def ready(step_id: str) -> bool:
+            if step_id in started:
+                return False
+            if step_id in tasks.dangling or step_id in tasks.cyclic:
+                # Une dépendance inconnue peut encore arriver dans le flux
+                return plan_done
+            return all(dep in finished for dep in tasks.plan_dependencies[step_id])
+
+        def start(step_id: str):
+            started.add(step_id)
+            running[step_id] = asyncio.create_task(worker(tasks[step_id]))
+
+        def start_ready():
+            for task in tasks:
+                if ready(task.step_id):
+                    start(task.step_id)
+
+        plan_reader = asyncio.create_task(planner(planning)) if planning else None
+        try:
+            start_ready()
+            while running or not plan_done:
+                task, item = await events.get()
+                if task is None and item is _PLAN_DONE:
+                    plan_done = True
+                    start_ready()
+                elif item is _DONE:
+                    running.pop(task.step_id, None)
+                    finished.add(task.step_id)
+                    for step_id in tasks.dependents[task.step_id]:
+                        if ready(step_id):
+                            start(step_id)
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+                    if task is None and len(tasks) != known:
+                        known = len(tasks)
+                        start_ready()
+        finally:
+            # Client déconnecté ou erreur : on annule les tâches restantes
+            if plan_reader is not None:
+                plan_reader.cancel()
+            for running_task in running.values():
+                running_task.cancel()
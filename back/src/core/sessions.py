@@ -0,0 +1,192 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Optional, Protocol, TypeVar
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+
+class SessionState(Protocol):
+    def export_state(self) -> Dict[str, Any]: ...
+
+    def load_state(self, state: Dict[str, Any]): ...
+
+
+S = TypeVar("S", bound=SessionState)
+
+
+class SessionEntry(Generic[S]):
+    def __init__(self, session: S):
+        self.session = session
+        self.last_access = time.monotonic()
+        self.size = 0
+        self.updated_at: Optional[float] = None
+
+
+class SessionStore(Generic[S]):
+    """
+    Sessions de chat en mémoire, bornées : expiration après `idle_ttl`
+    secondes d'inactivité, et éviction LRU au-delà de `max_sessions`
+    sessions ou `max_bytes` d'état. Avec `db_path`, l'état d'une session
+    évincée est écrit dans SQLite et restauré quand elle revient.
+
+    En mode `shared`, SQLite (WAL) devient la référence : chaque tour y est
+    écrit, et une session modifiée par un autre worker est relue avant
+    d'être servie. Plusieurs workers uvicorn peuvent alors servir la même
+    session.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], S],
+        max_sessions: int = 1000,
+        idle_ttl: float = 3600,
+        max_bytes: int = 256 * 1024 * 1024,
+        db_path: Optional[str] = None,
+        shared: bool = False,
+    ):
+        self.factory = factory
+        self.shared = shared and db_path is not None
+        self.max_sessions = max(1, max_sessions)
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[uuid.UUID, SessionEntry[S]] = OrderedDict()
+        self.size = 0
+        self.evicted = 0
+        self.lock = threading.Lock()
+        self.db: Optional[sqlite3.Connection] = None
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self.db = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                """CREATE TABLE IF NOT EXISTS sessions (
+                    session_id TEXT PRIMARY KEY, state TEXT, updated_at REAL)"""
+            )
+            self.db.commit()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def create(self) -> uuid.UUID:
+        session_id = uuid.uuid4()
+        with self.lock:
+            entry = self.entries[session_id] = SessionEntry(self.factory())
+            self.account(entry)
+            if self.shared:
+                entry.updated_at = self.save(session_id, entry.session)
+            self.evict(keep=session_id)
+        return session_id
+
+    def get(self, session_id: uuid.UUID) -> Optional[S]:
+        with self.lock:
+            entry = self.entries.get(session_id)
+            if entry is None:
+                loaded = self.load(session_id)
+                if loaded is None:
+                    return None
+                session = self.factory()
+                session.load_state(loaded[0])
+                entry = self.entries[session_id] = SessionEntry(session)
+                entry.updated_at = loaded[1]
+                self.account(entry)
+            elif self.shared:
+                # Un autre worker a pu jouer un tour depuis notre dernière lecture
+                loaded = self.load(session_id, known=entry.updated_at)
+                if loaded is not None:
+                    entry.session.load_state(loaded[0])
+                    entry.updated_at = loaded[1]
+                    self.account(entry)
+
+            entry.last_access = time.monotonic()
+            self.entries.move_to_end(session_id)
+            self.evict(keep=session_id)
+            return entry.session
+
+    def touch(self, session_id: uuid.UUID, session: S):
+        """À appeler après chaque tour : met à jour la taille de la session."""
+        with self.lock:
+            entry = self.entries.get(session_id)
+            if entry is None:
+                # Évincée pendant le tour : on réécrit son nouvel état
+                self.save(session_id, session)
+                return
+            if self.shared:
+                entry.updated_at = self.save(session_id, session)
+            self.account(entry)
+            self.evict(keep=session_id)
+
+    def account(self, entry: SessionEntry[S]):
+        size = len(json.dumps(entry.session.export_state()))
+        self.size += size - entry.size
+        entry.size = size
+
+    def evict(self, keep: Optional[uuid.UUID] = None):
+        now = time.monotonic()
+        while self.entries:
+            session_id, entry = next(iter(self.entries.items()))
+            if session_id == keep:
+                break
+            expired = now - entry.last_access > self.idle_ttl
+            too_many = len(self.entries) > self.max_sessions
+            too_big = self.size > self.max_bytes
+            if not (expired or too_many or too_big):
+                break
+            del self.entries[session_id]
+            self.size -= entry.size
+            self.evicted += 1
+            if not self.shared:
+                # En mode partagé, l'état est déjà écrit à chaque tour
+                self.save(session_id, entry.session)
+
+    def save(self, session_id: uuid.UUID, session: S) -> Optional[float]:
+        if self.db is None:
+            return None
+        updated_at = time.time()
+        try:
+            self.db.execute(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+                (str(session_id), json.dumps(session.export_state()), updated_at),
+            )
+            self.db.commit()
+            return updated_at
+        except sqlite3.Error as e:
+            logging.error(f"Failed to save session {session_id}: {e}")
+            return None
+
+    def load(
+        self, session_id: uuid.UUID, known: Optional[float] = None
+    ) -> Optional[tuple[Dict[str, Any], float]]:
+        """État et date d'écriture, seulement s'ils diffèrent de `known`."""
+        if self.db is None:
+            return None
+        try:
+            row = self.db.execute(
+                "SELECT state, updated_at FROM sessions "
+                "WHERE session_id = ? AND updated_at IS NOT ?",
+                (str(session_id), known),
+            ).fetchone()
+            return (json.loads(row[0]), row[1]) if row else None
+        except sqlite3.Error as e:
+            logging.error(f"Failed to load session {session_id}: {e}")
+            return None
+
+    def close(self):
+        """Écrit toutes les sessions encore en mémoire (arrêt du serveur)."""
+        with self.lock:
+            if not self.shared:
+                for session_id, entry in self.entries.items():
+                    self.save(session_id, entry.session)
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "sessions": len(self.entries),
+            "memory_bytes": self.size,
+            "evicted": self.evicted,
+        }
@@ -0,0 +1,188 @@
+from enum import Enum
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, Optional
+from pydantic import BaseModel, TypeAdapter
+from .models import AgentResponse, AgentsMetrics, Status
+import asyncio
+import time
+
+
+class StreamFormat(Enum):
+    FULL = "full"  # AgentsMetrics complet à chaque chunk
+    DELTA = "delta"  # snapshot initial, puis uniquement les champs modifiés
+
+
+class MetricsDelta(BaseModel):
+    agents: Dict[str, Dict[str, Any]] = {}
+    total_time: Optional[float] = None
+    counters: Optional[Dict[str, int]] = None  # compteurs modifiés seulement
+    trace: Optional[Dict[str, float]] = None
+
+
+class AgentResponseDelta(BaseModel):
+    id: str
+    chunk: str
+    delta: Optional[MetricsDelta] = None
+
+
+# Sérialiseurs compilés une seule fois pour tout le processus
+_response_adapter = TypeAdapter(AgentResponse)
+_delta_adapter = TypeAdapter(AgentResponseDelta)
+_agent_fields_adapter = TypeAdapter(Dict[str, Any])
+
+
+class ChunkEncoder:
+    """
+    Encode les AgentResponse d'un flux /chat en lignes NDJSON.
+    En mode DELTA, le premier chunk et le dernier (snapshot=True) portent
+    les métriques complètes ; les autres ne portent que les champs des
+    AgentData, les compteurs et la trace qui ont changé depuis le chunk
+    précédent.
+    """
+
+    def __init__(self, stream_format: StreamFormat = StreamFormat.FULL):
+        self.stream_format = stream_format
+        self.sent_agents: Optional[Dict[str, Dict[str, Any]]] = None
+        self.sent_total_time: float = 0.0
+        self.sent_counters: Dict[str, int] = {}
+        self.sent_trace: Dict[str, float] = {}
+
+    def encode(self, agent_response: AgentResponse, snapshot: bool = False) -> bytes:
+        if self.stream_format == StreamFormat.FULL:
+            return _response_adapter.dump_json(agent_response) + b"\n"
+
+        metrics = agent_response.metrics
+        if snapshot or self.sent_agents is None:
+            self.remember(metrics)
+            return _response_adapter.dump_json(agent_response) + b"\n"
+
+        delta = self.diff(metrics)
+        response = AgentResponseDelta(
+            id=agent_response.id, chunk=agent_response.chunk, delta=delta
+        )
+        return _delta_adapter.dump_json(response, exclude_none=True) + b"\n"
+
+    def remember(self, metrics: AgentsMetrics):
+        self.sent_agents = {
+            agent_id: dict(agent.__dict__) for agent_id, agent in metrics.agents.items()
+        }
+        self.sent_total_time = metrics.total_time
+        self.sent_counters = dict(metrics.counters)
+        self.sent_trace = dict(metrics.trace)
+
+    def diff(self, metrics: AgentsMetrics) -> Optional[MetricsDelta]:
+        assert self.sent_agents is not None
+        changed: Dict[str, Dict[str, Any]] = {}
+        for agent_id, agent in metrics.agents.items():
+            current = agent.__dict__
+            previous = self.sent_agents.get(agent_id)
+            if previous is None:
+                fields = dict(current)
+            else:
+                fields = {
+                    name: value
+                    for name, value in current.items()
+                    if previous.get(name) != value
+                }
+                if not fields:
+                    continue
+            self.sent_agents[agent_id] = dict(current)
+            changed[agent_id] = _agent_fields_adapter.dump_python(fields, mode="json")
+
+        total_time = None
+        if metrics.total_time != self.sent_total_time:
+            total_time = self.sent_total_time = metrics.total_time
+
+        counters = {
+            name: value
+            for name, value in metrics.counters.items()
+            if self.sent_counters.get(name) != value
+        }
+        self.sent_counters.update(counters)
+
+        trace = None
+        if metrics.trace != self.sent_trace:
+            trace = self.sent_trace = dict(metrics.trace)
+
+        if not changed and total_time is None and not counters and trace is None:
+            return None
+        return MetricsDelta(
+            agents=changed,
+            total_time=total_time,
+            counters=counters or None,
+            trace=trace,
+        )
+
+
+async def coalesce(
+    responses: AsyncIterator[AgentResponse],
+    interval: float = 0.03,
+    max_bytes: int = 1024,
+) -> AsyncGenerator[AgentResponse, None]:
+    """
+    Regroupe les chunks reçus avant l'envoi, avec un tampon par agent.
+    Les tampons sont vidés après `interval` secondes, dès `max_bytes`
+    octets, ou immédiatement quand le statut d'un agent change.
+    """
+    if interval <= 0:
+        async for response in responses:
+            yield response
+        return
+
+    iterator = aiter(responses)
+    statuses: Dict[str, Status] = {}
+    buffers: Dict[str, AgentResponse] = {}
+    buffered_bytes = 0
+    deadline = 0.0
+    pending: Optional[asyncio.Future] = None
+
+    def status_changed(metrics: AgentsMetrics) -> bool:
+        changed = False
+        for agent_id, agent in metrics.agents.items():
+            if statuses.get(agent_id) != agent.status:
+                statuses[agent_id] = agent.status
+                changed = True
+        return changed
+
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(anext(iterator))
+
+            timeout = max(0.0, deadline - time.monotonic()) if buffers else None
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                # Pas de nouveau chunk à temps : on envoie ce qu'on a
+                for buffer in buffers.values():
+                    yield buffer
+                buffers.clear()
+                continue
+
+            try:
+                response = pending.result()
+            except StopAsyncIteration:
+                break
+            finally:
+                pending = None
+
+            if not buffers:
+                buffered_bytes = 0
+                deadline = time.monotonic() + interval
+
+            buffer = buffers.get(response.id)
+            if buffer is None:
+                buffers[response.id] = response.model_copy()
+            else:
+                buffer.chunk += response.chunk
+                buffer.metrics = response.metrics
+            buffered_bytes += len(response.chunk.encode())
+
+            if status_changed(response.metrics) or buffered_bytes >= max_bytes:
+                for buffer in buffers.values():
+                    yield buffer
+                buffers.clear()
+
+        for buffer in buffers.values():
+            yield buffer
+    finally:
+        if pending is not None:
+            pending.cancel()
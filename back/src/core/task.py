@@ -1,4 +1,6 @@
+from collections import deque
 from dataclasses import dataclass
+from typing import Optional
 from .models import Status
 import json
 import logging
@@ -11,12 +13,26 @@ class PlannedTask:
     description: str
     dependencies: list[str]
     status: Status = Status.QUEUED
+    # Appel d'outil explicite fourni par le Planner (optionnel)
+    tool: Optional[dict] = None
 
 
 class Tasks:
+    """
+    Plan indexé : tri topologique (Kahn) en O(V+E), niveau de chaque tâche
+    (les tâches d'un même niveau sont indépendantes), index id -> tâche,
+    et rapport explicite des cycles et des dépendances inexistantes.
+    """
+
     def __init__(self, json_response: str, default_dep: str):
-        self.tasks: list[PlannedTask] = self.init_tasks(json_response, default_dep)
         self.default_dep = default_dep
+        self.by_id: dict[str, PlannedTask] = {}
+        self.dependents: dict[str, list[str]] = {}
+        self.plan_dependencies: dict[str, list[str]] = {}
+        self.levels: dict[str, int] = {}
+        self.dangling: dict[str, list[str]] = {}
+        self.cyclic: list[str] = []
+        self.tasks: list[PlannedTask] = self.init_tasks(json_response, default_dep)
 
     def __iter__(self):
         return iter(self.tasks)
@@ -24,9 +40,13 @@ class Tasks:
     def __len__(self):
         return len(self.tasks)
 
+    def __getitem__(self, step_id: str) -> PlannedTask:
+        return self.by_id[step_id]
+
     def init_tasks(self, json_response: str, default_dep: str) -> list[PlannedTask]:
         parsed_tasks = self.parse_tasks(json_response, default_dep)
         sorted_tasks = self.topological_sort(parsed_tasks)
+        self.report()
         return sorted_tasks
 
     def parse_tasks(self, json_response: str, default_dep: str) -> list[PlannedTask]:
@@ -40,58 +60,220 @@ class Tasks:
                 cleaned_response = cleaned_response[start : end + 1]
 
             data = json.loads(cleaned_response)
-            tasks = []
-            for item in data:
-                task = PlannedTask(
-                    step_id=item.get("step_id", ""),
-                    title=item.get("title", ""),
-                    description=item.get("description", ""),
-                    dependencies=item.get("dependencies", default_dep),
-                    status=Status.QUEUED,
+            tasks: list[PlannedTask] = []
+            for index, item in enumerate(data, start=1):
+                tasks.append(
+                    self.unique_id(self.make_task(item, default_dep, index), tasks)
                 )
-                if task.dependencies is None or task.dependencies == []:
-                    task.dependencies = [default_dep]
-                tasks.append(task)
             return tasks
         except Exception as e:
             logging.error(f"Failed to parse json : {e}")
             raise e
             return []
 
+    @staticmethod
+    def make_task(item: dict, default_dep: str, index: int) -> PlannedTask:
+        # "id" : format de l'exemple du prompt ; sinon position dans le plan
+        step_id = item.get("step_id") or item.get("id") or f"step_{index}"
+        dependencies = item.get("dependencies") or []
+        if isinstance(dependencies, str):
+            dependencies = [dependencies]
+        return PlannedTask(
+            step_id=str(step_id),
+            title=item.get("title", ""),
+            description=item.get("description", ""),
+            dependencies=dependencies or [default_dep],
+            status=Status.QUEUED,
+            tool=item.get("tool") if isinstance(item.get("tool"), dict) else None,
+        )
+
+    @staticmethod
+    def unique_id(task: PlannedTask, tasks: list[PlannedTask]) -> PlannedTask:
+        """Renomme une tâche dont l'id est déjà pris (s1 -> s1_2) au lieu de la perdre."""
+        taken = {t.step_id for t in tasks}
+        if task.step_id in taken:
+            base, suffix = task.step_id, 2
+            while f"{base}_{suffix}" in taken:
+                suffix += 1
+            logging.warning(f"Duplicate step_id in plan: {base} -> {base}_{suffix}")
+            task.step_id = f"{base}_{suffix}"
+        return task
+
+    def add(self, item: dict):
+        """
+        Ajoute une tâche arrivée dans le flux du Planner et réindexe le plan.
+        Les erreurs ne sont signalées (`report`) qu'une fois le plan complet.
+        """
+        task = self.make_task(item, self.default_dep, len(self.tasks) + 1)
+        self.tasks = self.topological_sort(
+            [*self.tasks, self.unique_id(task, self.tasks)]
+        )
+
+    def build_index(self, tasks: list[PlannedTask]):
+        self.by_id = {}
+        for task in tasks:
+            if task.step_id in self.by_id:
+                logging.warning(f"Duplicate step_id in plan: {task.step_id}")
+                continue
+            self.by_id[task.step_id] = task
+
+        self.dependents = {step_id: [] for step_id in self.by_id}
+        self.plan_dependencies = {}
+        self.dangling = {}
+        for step_id, task in self.by_id.items():
+            plan_deps = []
+            for dep in dict.fromkeys(task.dependencies):
+                if dep in self.by_id:
+                    plan_deps.append(dep)
+                    self.dependents[dep].append(step_id)
+                elif dep != self.default_dep:
+                    self.dangling.setdefault(step_id, []).append(dep)
+            self.plan_dependencies[step_id] = plan_deps
+
     def topological_sort(self, tasks: list[PlannedTask]) -> list[PlannedTask]:
+        self.build_index(tasks)
+
+        in_degree = {
+            step_id: len(deps) for step_id, deps in self.plan_dependencies.items()
+        }
+        ready = deque(step_id for step_id, degree in in_degree.items() if degree == 0)
+        self.levels = {step_id: 0 for step_id in ready}
         sorted_tasks = []
-        remaining = tasks.copy()
-
-        max_iterations = len(tasks) * 2
-        iterations = 0
-
-        while remaining and iterations < max_iterations:
-            iterations += 1
-            progress = False
-            for task in remaining:
-                if all(
-                    dep in [t.step_id for t in sorted_tasks]
-                    for dep in task.dependencies
-                ):
-                    sorted_tasks.append(task)
-                    remaining.remove(task)
-                    progress = True
-                    break
-
-            if not progress:
-                sorted_tasks.extend(remaining)
-                break
+
+        while ready:
+            step_id = ready.popleft()
+            sorted_tasks.append(self.by_id[step_id])
+            for dependent in self.dependents[step_id]:
+                self.levels[dependent] = max(
+                    self.levels.get(dependent, 0), self.levels[step_id] + 1
+                )
+                in_degree[dependent] -= 1
+                if in_degree[dependent] == 0:
+                    ready.append(dependent)
+
+        # Tâches restantes : prises dans un cycle ou en aval d'un cycle
+        self.cyclic = [step_id for step_id, degree in in_degree.items() if degree > 0]
+        if self.cyclic:
+            for step_id in self.cyclic:
+                self.levels.pop(step_id, None)
+            sorted_tasks.extend(self.by_id[step_id] for step_id in self.cyclic)
 
         return sorted_tasks
 
+    def report(self):
+        if self.dangling:
+            logging.warning(f"Dangling dependencies in plan: {self.dangling}")
+        if self.cyclic:
+            logging.warning(f"Dependency cycle in plan: {self.cyclic}")
+
+    def batches(self) -> list[list[PlannedTask]]:
+        """Tâches groupées par niveau, exécutables ensemble."""
+        batches: list[list[PlannedTask]] = []
+        for task in self.tasks:
+            level = self.levels.get(task.step_id)
+            if level is None:
+                continue
+            while len(batches) <= level:
+                batches.append([])
+            batches[level].append(task)
+        return batches
+
+    def errors(self) -> list[str]:
+        errors = [
+            f"{step_id} dépend de tâches inexistantes : {', '.join(deps)}"
+            for step_id, deps in self.dangling.items()
+        ]
+        if self.cyclic:
+            errors.append(
+                f"Cycle de dépendances (ou en aval d'un cycle) : {', '.join(self.cyclic)}"
+            )
+        return errors
+
+    def to_template(self) -> str:
+        """Plan au format JSON du Planner, sans la dépendance par défaut."""
+        template = []
+        for t in self.tasks:
+            item = {
+                "step_id": t.step_id,
+                "title": t.title,
+                "description": t.description,
+                "dependencies": [
+                    dep for dep in t.dependencies if dep != self.default_dep
+                ],
+            }
+            if t.tool is not None:
+                item["tool"] = t.tool
+            template.append(item)
+        return json.dumps(template, ensure_ascii=False)
+
     def dependencies_met(self, task: PlannedTask) -> bool:
-        task_ids = {t.step_id for t in self.tasks}
-        task_ids.add(self.default_dep)
-        return all(dep in task_ids for dep in task.dependencies)
+        return task.step_id not in self.dangling and task.step_id in self.levels
 
     def render_tasks(self) -> str:
         plan_desc = "\n**Plan généré :**\n"
         for t in self.tasks:
             plan_desc += f"- {t.step_id}: {t.description}\n"
+        for error in self.errors():
+            plan_desc += f"- **Erreur :** {error}\n"
         plan_desc += "\n"
         return plan_desc
+
+
+class PlanStreamParser:
+    """
+    Lecture incrémentale du tableau JSON produit par le Planner : chaque
+    objet est rendu dès que son accolade fermante arrive, sans attendre la
+    fin du flux. Le texte autour du tableau (```json, explications) est
+    ignoré, comme dans `Tasks.parse_tasks`.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.depth = 0  # 1 : directement dans le tableau
+        self.in_string = False
+        self.escape = False
+        self.object_start = -1
+        self.closed = False
+
+    def feed(self, chunk: str) -> list[dict]:
+        self.buffer += chunk
+        items = []
+        while self.pos < len(self.buffer) and not self.closed:
+            char = self.buffer[self.pos]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+            elif self.depth == 0:
+                if char == "[":
+                    self.depth = 1
+            elif char == '"':
+                self.in_string = True
+            elif char in "[{":
+                if self.depth == 1 and char == "{":
+                    self.object_start = self.pos
+                self.depth += 1
+            elif char in "]}":
+                self.depth -= 1
+                if self.depth == 1 and char == "}" and self.object_start >= 0:
+                    item = self.parse(self.buffer[self.object_start : self.pos + 1])
+                    if item is not None:
+                        items.append(item)
+                    self.object_start = -1
+                elif self.depth == 0:
+                    self.closed = True
+            self.pos += 1
+        return items
+
+    @staticmethod
+    def parse(text: str) -> dict | None:
+        try:
+            item = json.loads(text)
+            return item if isinstance(item, dict) else None
+        except json.JSONDecodeError as e:
+            logging.error(f"Failed to parse planned task : {e}")
+            return None
@@ -0,0 +1,127 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+import json
+import os
+import time
+import uuid
+
+
+class Span:
+    __slots__ = ("name", "start", "end", "lane", "args")
+
+    def __init__(self, name: str, start: float, lane: str, args: Dict[str, Any]):
+        self.name = name
+        self.start = start
+        self.end = start
+        self.lane = lane
+        self.args = args
+
+
+class Trace:
+    """
+    Spans d'une requête /chat, exportés au format Chrome Trace Event
+    (chrome://tracing, Perfetto). Chaque "lane" (flux principal, Planner,
+    tâche du plan...) devient un thread du trace, où les spans s'emboîtent
+    par leurs horaires.
+    """
+
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex
+        self.origin = time.perf_counter()
+        self.started_at = time.time()
+        self.spans: list[Span] = []
+
+    def add(self, span: Span):
+        self.spans.append(span)
+
+    def summary(self) -> Dict[str, float]:
+        """Durée cumulée (ms) par catégorie de span : llm, tool, task..."""
+        totals: Dict[str, float] = {}
+        for span in self.spans:
+            category = span.name.split(":")[0]
+            totals[category] = totals.get(category, 0.0) + (span.end - span.start)
+        return {name: round(total * 1000, 3) for name, total in totals.items()}
+
+    def to_chrome(self) -> Dict[str, Any]:
+        lanes: Dict[str, int] = {}
+        events: list[Dict[str, Any]] = []
+        for span in sorted(self.spans, key=lambda s: s.start):
+            tid = lanes.setdefault(span.lane, len(lanes) + 1)
+            events.append(
+                {
+                    "name": span.name,
+                    "cat": span.name.split(":")[0],
+                    "ph": "X",
+                    "ts": (span.start - self.origin) * 1e6,
+                    "dur": (span.end - span.start) * 1e6,
+                    "pid": os.getpid(),
+                    "tid": tid,
+                    "args": span.args,
+                }
+            )
+        for lane, tid in lanes.items():
+            events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": os.getpid(),
+                    "tid": tid,
+                    "args": {"name": lane},
+                }
+            )
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"trace_id": self.trace_id, "started_at": self.started_at},
+        }
+
+    def export(self, directory: str) -> str:
+        """Écrit le trace dans `directory` (bloquant : hors boucle asyncio)."""
+        os.makedirs(directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started_at))
+        path = os.path.join(directory, f"{stamp}-{self.trace_id[:8]}.json")
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.to_chrome(), file, default=str)
+        return path
+
+
+# Le trace suit la requête dans toutes les tâches asyncio qu'elle crée
+_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+_lane: ContextVar[str] = ContextVar("trace_lane", default="main")
+
+
+def start_trace() -> Trace:
+    trace = Trace()
+    _trace.set(trace)
+    _lane.set("main")
+    return trace
+
+
+def set_lane(name: str):
+    """À appeler au début d'une tâche asyncio qui s'exécute en parallèle."""
+    _lane.set(name)
+
+
+@contextmanager
+def span(name: str, **args: Any) -> Iterator[Optional[Span]]:
+    """Span autour d'un bloc ; sans trace actif, ne fait rien."""
+    trace = _trace.get()
+    if trace is None:
+        yield None
+        return
+    current = Span(name, time.perf_counter(), _lane.get(), args)
+    try:
+        yield current
+    finally:
+        current.end = time.perf_counter()
+        trace.add(current)
+
+
+def record_span(name: str, start: float, end: float, **args: Any):
+    """Span a posteriori, à partir d'horaires `time.perf_counter()`."""
+    trace = _trace.get()
+    if trace is not None:
+        current = Span(name, start, _lane.get(), args)
+        current.end = end
+        trace.add(current)
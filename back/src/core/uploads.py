@@ -0,0 +1,207 @@
+from typing import AsyncIterator, Optional
+from python_multipart.exceptions import FormParserError
+from python_multipart.multipart import MultipartParser, parse_options_header
+import asyncio
+import hashlib
+import mimetypes
+import os
+import tempfile
+import time
+
+FLUSH_BYTES = 1 << 20
+
+# Marge pour les en-têtes et délimiteurs multipart autour du fichier
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class UnsupportedUpload(ValueError):
+    pass
+
+
+class MalformedUpload(ValueError):
+    pass
+
+
+def upload_extension(content_type: str) -> str:
+    """Extension canonique du type : un même contenu a toujours le même nom."""
+    return mimetypes.guess_extension(content_type) or ""
+
+
+def purge_incoming(incoming_dir: str, max_age: float = 3600):
+    """Supprime les `.part` laissés par un upload interrompu (ex: crash)."""
+    now = time.time()
+    for entry in os.scandir(incoming_dir):
+        if entry.name.endswith(".part") and now - entry.stat().st_mtime > max_age:
+            os.remove(entry.path)
+
+
+class UploadWriter:
+    """
+    Écrit un upload dans `uploads_dir` sous le nom `<sha256><extension>`, en
+    hachant pendant l'écriture. Un contenu déjà présent n'est pas réécrit.
+    Le fichier en cours est dans `incoming_dir`, non servi, sur le même
+    système de fichiers (renommage atomique).
+    Méthodes bloquantes : à appeler hors de la boucle asyncio.
+    """
+
+    def __init__(self, uploads_dir: str, incoming_dir: str):
+        self.uploads_dir = uploads_dir
+        self.digest = hashlib.sha256()
+        fd, self.tmp_path = tempfile.mkstemp(dir=incoming_dir, suffix=".part")
+        self.buffer = os.fdopen(fd, "wb")
+
+    def write(self, block: bytes):
+        self.digest.update(block)
+        self.buffer.write(block)
+
+    def commit(self, extension: str) -> str:
+        self.buffer.close()
+        file_name = f"{self.digest.hexdigest()}{extension}"
+        file_path = os.path.join(self.uploads_dir, file_name)
+        if os.path.exists(file_path):
+            os.remove(self.tmp_path)
+        else:
+            os.replace(self.tmp_path, file_path)
+        return file_name
+
+    def discard(self):
+        self.buffer.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class MultipartFile:
+    """
+    Analyse incrémentale d'un corps multipart/form-data : seules les données
+    du premier fichier du champ `field` sont gardées, et la limite de taille
+    s'applique au fil des chunks reçus, sans attendre la fin du corps.
+    """
+
+    def __init__(
+        self,
+        content_type: str,
+        allowed_types: list[str],
+        max_bytes: int,
+        field: str = "file",
+    ):
+        _, params = parse_options_header(content_type)
+        boundary = params.get(b"boundary")
+        if not boundary:
+            raise MalformedUpload("Missing multipart boundary")
+
+        self.allowed_types = allowed_types
+        self.max_bytes = max_bytes
+        self.field = field
+        self.content_type: Optional[str] = None  # type du fichier trouvé
+        self.size = 0
+        self.pending: list[bytes] = []
+        self.done = False  # fichier lu en entier
+
+        self.headers: dict[bytes, bytes] = {}
+        self.header_field = b""
+        self.header_value = b""
+        self.in_file = False
+        self.parser = MultipartParser(
+            boundary,
+            callbacks={
+                "on_part_begin": self.on_part_begin,
+                "on_header_field": self.on_header_field,
+                "on_header_value": self.on_header_value,
+                "on_header_end": self.on_header_end,
+                "on_headers_finished": self.on_headers_finished,
+                "on_part_data": self.on_part_data,
+                "on_part_end": self.on_part_end,
+            },
+        )
+
+    def feed(self, chunk: bytes):
+        try:
+            self.parser.write(chunk)
+        except FormParserError as e:
+            raise MalformedUpload(str(e)) from e
+
+    def finish(self):
+        self.feed(b"")
+        self.parser.finalize()
+        if not self.done:
+            raise MalformedUpload(f"Missing file field '{self.field}'")
+
+    @property
+    def buffered(self) -> int:
+        return sum(len(block) for block in self.pending)
+
+    def take(self) -> bytes:
+        data, self.pending = b"".join(self.pending), []
+        return data
+
+    def on_part_begin(self):
+        self.headers = {}
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self.header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self.header_value += data[start:end]
+
+    def on_header_end(self):
+        self.headers[self.header_field.lower()] = self.header_value
+        self.header_field = self.header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self.headers.get(b"content-disposition"))
+        if self.done or self.content_type is not None:
+            return
+        if options.get(b"name") != self.field.encode() or b"filename" not in options:
+            return
+        content_type = self.headers.get(b"content-type", b"").decode("latin-1")
+        if content_type not in self.allowed_types:
+            raise UnsupportedUpload(f"Unsupported file type: {content_type}")
+        self.content_type = content_type
+        self.in_file = True
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if not self.in_file:
+            return
+        self.size += end - start
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(f"File exceeds {self.max_bytes} bytes")
+        self.pending.append(data[start:end])
+
+    def on_part_end(self):
+        if self.in_file:
+            self.in_file = False
+            self.done = True
+
+
+async def receive_upload(
+    chunks: AsyncIterator[bytes],
+    content_type: str,
+    uploads_dir: str,
+    incoming_dir: str,
+    allowed_types: list[str],
+    max_bytes: int,
+) -> str:
+    """
+    Reçoit un upload multipart en flux : chaque bloc est haché et écrit dès
+    son arrivée (par paquets de `FLUSH_BYTES`, dans un thread), sans copie
+    complète préalable du corps de la requête. Renvoie le nom du fichier.
+    """
+    upload = MultipartFile(content_type, allowed_types, max_bytes)
+    writer = await asyncio.to_thread(UploadWriter, uploads_dir, incoming_dir)
+    try:
+        async for chunk in chunks:
+            upload.feed(chunk)
+            if upload.buffered >= FLUSH_BYTES:
+                await asyncio.to_thread(writer.write, upload.take())
+        upload.finish()
+        await asyncio.to_thread(writer.write, upload.take())
+        return await asyncio.to_thread(
+            writer.commit, upload_extension(upload.content_type or "")
+        )
+    except BaseException:
+        await asyncio.to_thread(writer.discard)
+        raise
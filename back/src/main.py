@@ -1,26 +1,76 @@
+import asyncio
 import uvicorn
 import os
 import uuid
 import time
-import shutil
+from contextlib import asynccontextmanager
 from typing import Optional
 
-from fastapi import FastAPI, File, UploadFile
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-from typing import Generator
+from typing import AsyncGenerator
 
 from fastapi.responses import StreamingResponse
 
-from src.agents.planner import PlannerAgent
+from src.agents.planner import PlannerAgent, plan_cache, router
 from src.agents.agent import AgentResponse
+from src.agents.client import close_client, get_client
+from src.agents.executor import prefetch, prefetch_image
+from src.agents.telemetrics import sink as telemetry_sink
 from src.core.models import AgentsMetrics, Status
+from src.core.config import (
+    CLASSIFICATION_PRELOAD,
+    PREFETCH_ENABLED,
+    SESSION_DB,
+    SESSION_IDLE_TTL,
+    SESSION_MAX_BYTES,
+    SESSION_MAX_COUNT,
+    SESSION_SHARED,
+    STREAM_FLUSH_BYTES,
+    STREAM_FLUSH_INTERVAL_MS,
+    TRACE_DIR,
+    TRACE_SUMMARY,
+    TRACING_ENABLED,
+    UPLOAD_ALLOWED_TYPES,
+    UPLOAD_MAX_BYTES,
+)
+from src.core.runtime import LoopMonitor, process_stats
+from src.core.sessions import SessionStore
+from src.core.stream import ChunkEncoder, StreamFormat, coalesce
+from src.core.tracing import record_span, start_trace
+from src.core.uploads import (
+    MULTIPART_OVERHEAD,
+    MalformedUpload,
+    UnsupportedUpload,
+    UploadTooLarge,
+    purge_incoming,
+    receive_upload,
+)
+from src.tools.classification import model_status, start_loading
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    get_client()
+    loop_monitor.start()
+    telemetry_sink.start()
+    if CLASSIFICATION_PRELOAD:
+        start_loading()
+    yield
+    prefetch.cancel_all()
+    loop_monitor.stop()
+    await close_client()
+    await asyncio.to_thread(telemetry_sink.stop)
+    chats.close()
+
 
 app = FastAPI(
     title="Onco-Agent API",
     description="API REST Asynchrone pour le système multi-agents",
     version="1.1.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -36,91 +86,194 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-chats = {}  # how stored chats
+loop_monitor = LoopMonitor()
+
+chats: SessionStore[PlannerAgent] = SessionStore(
+    PlannerAgent,
+    max_sessions=SESSION_MAX_COUNT,
+    idle_ttl=SESSION_IDLE_TTL,
+    max_bytes=SESSION_MAX_BYTES,
+    db_path=SESSION_DB,
+    shared=SESSION_SHARED,
+)
 
 base_dir = os.path.dirname(os.path.abspath(__file__))
 static_dir = os.path.join(base_dir, "../static")
 uploads_dir = os.path.join(static_dir, "uploads")
 input_dir = os.path.join(base_dir, "../data/inputs")
+# Uploads en cours : hors de /static, sur le même disque que uploads_dir
+incoming_dir = os.path.join(base_dir, "../data/incoming")
 
 os.makedirs(input_dir, exist_ok=True)
 os.makedirs(uploads_dir, exist_ok=True)
+os.makedirs(incoming_dir, exist_ok=True)
+purge_incoming(incoming_dir)
 
 app.mount("/static", StaticFiles(directory=static_dir), name="static")
 
 
 @app.get("/health")
 def health_check():
-    return {"status": "running", "mode": "async"}
+    classification = model_status()
+    return {
+        "status": "running",
+        "mode": "async",
+        "ready": classification == "ready",
+        "classification_model": classification,
+        "sessions": chats.stats(),
+        "plan_cache": plan_cache.counters(),
+        "routes": router.counters(),
+        "prefetch": prefetch.counters(),
+        "runtime": {**process_stats(), **loop_monitor.stats()},
+    }
 
 
 class ChatRequest(BaseModel):
     question: str
     session_id: uuid.UUID
     image_url: Optional[str] = None
+    stream_format: StreamFormat = StreamFormat.FULL
 
 
 class ChatSession(BaseModel):
     session_id: uuid.UUID
 
 
-@app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
-    file_extension = os.path.splitext(str(file.filename))[1]
-    file_name = f"{uuid.uuid4()}{file_extension}"
-    file_path = os.path.join(uploads_dir, file_name)
+@app.post(
+    "/upload",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "properties": {"file": {"type": "string", "format": "binary"}},
+                        "required": ["file"],
+                    }
+                }
+            },
+        }
+    },
+)
+async def upload_file(request: Request):
+    # Refus immédiat, avant de lire le corps, si la taille annoncée dépasse
+    content_length = request.headers.get("content-length")
+    if (
+        content_length is not None
+        and content_length.isdigit()
+        and int(content_length) > UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD
+    ):
+        raise HTTPException(
+            status_code=413, detail=f"File exceeds {UPLOAD_MAX_BYTES} bytes"
+        )
 
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # Le fichier est haché et écrit au fil des chunks reçus (pas de copie
+    # préalable du corps) ; la limite s'applique aussi en cours de lecture
+    try:
+        file_name = await receive_upload(
+            request.stream(),
+            request.headers.get("content-type", ""),
+            uploads_dir,
+            incoming_dir,
+            UPLOAD_ALLOWED_TYPES,
+            UPLOAD_MAX_BYTES,
+        )
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UnsupportedUpload as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except MalformedUpload as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    return {"url": f"/static/uploads/{file_name}"}
+    url = f"/static/uploads/{file_name}"
+    if PREFETCH_ENABLED:
+        prefetch_image(url)
+    return {"url": url}
 
 
 @app.post("/init-session")
 async def init_session() -> ChatSession:
-    session_id = uuid.uuid4()
-    chats[session_id] = {
-        "planner": PlannerAgent(),
-    }
+    # SQLite synchrone (commit, attente de verrou) : hors de la boucle asyncio
+    session_id = await asyncio.to_thread(chats.create)
     return ChatSession(session_id=session_id)
 
 
-def chat_generator(
-    session_id: uuid.UUID, question: str, image_url: Optional[str]
-) -> Generator[str, None, None]:
-    planner: PlannerAgent = chats[session_id]["planner"]
+async def chat_generator(
+    session_id: uuid.UUID,
+    planner: PlannerAgent,
+    question: str,
+    image_url: Optional[str],
+    stream_format: StreamFormat = StreamFormat.FULL,
+) -> AsyncGenerator[bytes, None]:
     metrics: AgentsMetrics = AgentsMetrics()
+    encoder = ChunkEncoder(stream_format)
     planner.reset_id()
     planner.update_status(Status.PENDING, metrics)
     start_time = time.time()
+    trace = start_trace() if TRACING_ENABLED or TRACE_SUMMARY else None
+    started_at = time.perf_counter()
+    serialization = 0.0
 
     try:
-        for response in planner.plan(question, metrics, image_url):
-            yield create_chunk(response)
+        responses = coalesce(
+            planner.plan(question, metrics, image_url),
+            interval=STREAM_FLUSH_INTERVAL_MS / 1000,
+            max_bytes=STREAM_FLUSH_BYTES,
+        )
+        async for response in responses:
+            encode_start = time.perf_counter()
+            encoded = encoder.encode(response)
+            serialization += time.perf_counter() - encode_start
+            yield encoded
     except Exception as e:
-        yield create_chunk(
+        yield encoder.encode(
             AgentResponse(
                 metrics=metrics,
                 id=planner.agent_data.id,
                 chunk=f"**Erreur :** {str(e)}",
-            )
+            ),
+            snapshot=True,
         )
         raise e
 
+    await asyncio.to_thread(chats.touch, session_id, planner)
     metrics.total_time = time.time() - start_time
-    yield create_chunk(
-        AgentResponse(metrics=metrics, id=planner.agent_data.id, chunk="")
+    if trace is not None:
+        record_span(
+            "chat",
+            started_at,
+            time.perf_counter(),
+            session_id=str(session_id),
+            serialization_ms=serialization * 1000,
+        )
+        if TRACE_SUMMARY:
+            metrics.trace = {
+                **trace.summary(),
+                "serialization": round(serialization * 1000, 3),
+            }
+        if TRACING_ENABLED:
+            await asyncio.to_thread(trace.export, TRACE_DIR)
+    yield encoder.encode(
+        AgentResponse(metrics=metrics, id=planner.agent_data.id, chunk=""),
+        snapshot=True,
     )
 
 
-def create_chunk(agent_response: AgentResponse) -> str:
-    return agent_response.model_dump_json() + "\n"
-
-
 @app.post("/chat")
 async def chat(request: ChatRequest) -> StreamingResponse:
+    planner = await asyncio.to_thread(chats.get, request.session_id)
+    if planner is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+
     return StreamingResponse(
-        chat_generator(request.session_id, request.question, request.image_url)
+        chat_generator(
+            request.session_id,
+            planner,
+            request.question,
+            request.image_url,
+            request.stream_format,
+        )
     )
 
 
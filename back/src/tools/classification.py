@@ -1,40 +1,165 @@
-import tensorflow as tf
+from concurrent.futures import Future
+from typing import Any, Optional
+from src.core.cache import ResultCache, hash_file, make_key
+from src.core.config import (
+    CLASSIFICATION_BATCH_SIZE,
+    CLASSIFICATION_BATCH_WAIT_MS,
+    CLASSIFICATION_MODEL_PATH,
+    RESULT_CACHE_DB,
+    RESULT_CACHE_MAX_BYTES,
+    RESULT_CACHE_SIZE,
+)
+import logging
 import numpy as np
-from tensorflow.keras.preprocessing import image  # type: ignore
-import kagglehub
 import os
+import queue
+import shutil
+import threading
+import time
+
+MODEL_HANDLE = "sanchris/breast-cancer-detection-cnnrnn/tensorFlow2/updated"
+MODEL_FILE = "cnn_rnn_model_1.h5"
+img_height, img_width = 128, 128
+
+# TensorFlow n'est importé qu'au premier chargement du modèle
+_model: Any = None
+_model_error: Optional[str] = None
+_model_ready = threading.Event()
+_load_lock = threading.Lock()
+_loader: Optional[threading.Thread] = None
+
+
+def resolve_model_path() -> str:
+    """
+    Chemin local épinglé du modèle. Il n'est téléchargé depuis Kaggle
+    (appel réseau) que s'il n'est pas encore en cache.
+    """
+    if os.path.exists(CLASSIFICATION_MODEL_PATH):
+        return CLASSIFICATION_MODEL_PATH
+
+    import kagglehub
+
+    downloaded = os.path.join(kagglehub.model_download(MODEL_HANDLE), MODEL_FILE)
+    os.makedirs(os.path.dirname(CLASSIFICATION_MODEL_PATH), exist_ok=True)
+    shutil.copyfile(downloaded, CLASSIFICATION_MODEL_PATH)
+    return CLASSIFICATION_MODEL_PATH
+
+
+def load_model() -> Any:
+    global _model, _model_error
+    with _load_lock:
+        if _model_ready.is_set():
+            return _model
+
+        try:
+            import tensorflow as tf
+
+            model = tf.keras.models.load_model(resolve_model_path())  # type: ignore
+            # Warm-up : construit le graphe du chemin de service (BatchPredictor)
+            # avant la première vraie requête
+            model.predict_on_batch(np.zeros((1, img_height, img_width, 3)))
+            _model = model
+        except Exception as e:
+            logging.error(f"Error loading model: {e}")
+            _model_error = str(e)
+        finally:
+            _model_ready.set()
+        return _model
+
+
+def start_loading():
+    """Charge le modèle en arrière-plan, sans bloquer le démarrage de l'API."""
+    global _loader
+    if _loader is None and not _model_ready.is_set():
+        _loader = threading.Thread(target=load_model, daemon=True)
+        _loader.start()
+
+
+def model_status() -> str:
+    if not _model_ready.is_set():
+        return "loading" if _loader is not None else "not_loaded"
+    return "ready" if _model is not None else "error"
+
+
+class BatchPredictor:
+    """
+    Regroupe les images prétraitées des appels concurrents (jusqu'à
+    `max_batch` images ou `max_wait` secondes) en un seul passage du modèle,
+    puis renvoie à chaque appelant son propre score.
+    """
+
+    def __init__(self, max_batch: int, max_wait: float):
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self.requests: queue.Queue[tuple[np.ndarray, Future]] = queue.Queue()
+        self.worker: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
 
-try:
-    model_path = (
-        kagglehub.model_download(
-            "sanchris/breast-cancer-detection-cnnrnn/tensorFlow2/updated"
-        )
-        + "/cnn_rnn_model_1.h5"
-    )
-    model = tf.keras.models.load_model(model_path)  # type: ignore
-    img_height, img_width = 128, 128
-except Exception as e:
-    print(f"Error loading model: {e}")
-    model = None
+    def predict(self, img_array: np.ndarray) -> float:
+        future: Future = Future()
+        self.requests.put((img_array, future))
+        with self.lock:
+            if self.worker is None:
+                self.worker = threading.Thread(target=self.run, daemon=True)
+                self.worker.start()
+        return future.result()
 
+    def next_batch(self) -> list[tuple[np.ndarray, Future]]:
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(
+                    self.requests.get(timeout=remaining)
+                    if remaining > 0
+                    else self.requests.get_nowait()
+                )
+            except queue.Empty:
+                break
+        return batch
 
-def predict_single_image(image_path, model=model):
-    if model is None:
-        return "Error: Model not loaded."
+    def run(self):
+        while True:
+            batch = self.next_batch()
+            try:
+                model = load_model()
+                if model is None:
+                    raise RuntimeError(f"Model not loaded. {_model_error or ''}")
+                scores = model.predict_on_batch(np.stack([img for img, _ in batch]))
+                for (_, future), score in zip(batch, scores):
+                    future.set_result(float(score[0]))
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+
+batch_predictor = BatchPredictor(
+    CLASSIFICATION_BATCH_SIZE, CLASSIFICATION_BATCH_WAIT_MS / 1000
+)
+
+
+def predict_single_image(image_path, model=None):
+    if model is None and load_model() is None:
+        return f"Error: Model not loaded. {_model_error or ''}".strip()
 
     if not os.path.exists(image_path):
         return f"Error: File not found at {image_path}"
 
     try:
+        from tensorflow.keras.preprocessing import image  # type: ignore
+
         # Preprocessing
         img = image.load_img(image_path, target_size=(img_height, img_width))
         img_array = image.img_to_array(img)
-        img_array = np.expand_dims(img_array, axis=0)
         img_array = img_array / 255.0
 
-        # Prediction
-        prediction_prob = model.predict(img_array, verbose=0)
-        score = prediction_prob[0][0]
+        # Prediction (regroupée avec les appels concurrents)
+        if model is None:
+            score = batch_predictor.predict(img_array)
+        else:
+            score = model.predict(np.expand_dims(img_array, axis=0), verbose=0)[0][0]
 
         # Interpretation
         if score > 0.5:
@@ -54,18 +179,39 @@ uploads_dir = os.path.join(
     os.path.dirname(os.path.abspath(__file__)), "../../static/uploads"
 )
 
+classification_cache = ResultCache(
+    "classification", RESULT_CACHE_SIZE, RESULT_CACHE_MAX_BYTES, RESULT_CACHE_DB
+)
 
-def classification_tool(image_path: str):
+
+def resolve_image_path(image_path: str) -> str:
     # try to correct the path
     if image_path.startswith("/"):
         image_path = image_path.lstrip("/")
     if os.path.exists(image_path):
-        return predict_single_image(image_path)
+        return image_path
     path_in_uploads = os.path.join(uploads_dir, image_path)
     if os.path.exists(path_in_uploads):
-        return predict_single_image(path_in_uploads)
+        return path_in_uploads
     filename = os.path.basename(image_path)
     path_from_filename = os.path.join(uploads_dir, filename)
     if os.path.exists(path_from_filename):
-        return predict_single_image(path_from_filename)
-    return predict_single_image(image_path)
+        return path_from_filename
+    return image_path
+
+
+def classification_tool(image_path: str):
+    image_path = resolve_image_path(image_path)
+    if not os.path.exists(image_path):
+        return predict_single_image(image_path)
+
+    # Même contenu d'image : même diagnostic, sans nouvelle inférence
+    cache_key = make_key(hash_file(image_path), MODEL_FILE)
+    cached = classification_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    result = predict_single_image(image_path)
+    if not result.startswith("Error"):
+        classification_cache.set(cache_key, result)
+    return result
@@ -0,0 +1,84 @@
+from src.core.cache import ResultCache, hash_file, make_key
+from src.core.config import (
+    VISION_GRAYSCALE,
+    VISION_IMAGE_CACHE_BYTES,
+    VISION_IMAGE_FORMAT,
+    VISION_IMAGE_QUALITY,
+    VISION_MAX_EDGE,
+)
+from PIL import Image, ImageChops, ImageStat, UnidentifiedImageError
+import base64
+import io
+import logging
+import mimetypes
+
+# Images déjà préparées, par hash du fichier et paramètres d'encodage
+prepared_images = ResultCache("vision_image", 64, VISION_IMAGE_CACHE_BYTES)
+
+
+def encode_raw(path: str) -> str:
+    mime_type, _ = mimetypes.guess_type(path)
+    with open(path, "rb") as image_file:
+        encoded_string = base64.b64encode(image_file.read()).decode("utf-8")
+    return f"data:{mime_type or 'image/jpeg'};base64,{encoded_string}"
+
+
+def is_grayscale(img: Image.Image, tolerance: float = 4.0) -> bool:
+    """
+    Image monocanal, ou couleur dont les canaux ne diffèrent presque pas
+    (radiographie exportée en RGB) ; une photo couleur garde ses couleurs.
+    """
+    if img.mode in ("1", "L", "LA", "I", "I;16", "F"):
+        return True
+    sample = img.convert("RGB").resize((64, 64))
+    red, green, blue = sample.split()
+    chroma = ImageChops.lighter(
+        ImageChops.difference(red, green), ImageChops.difference(green, blue)
+    )
+    return ImageStat.Stat(chroma).mean[0] <= tolerance
+
+
+def reencode(path: str) -> str:
+    """Réduit l'image (plus grand côté VISION_MAX_EDGE) et la ré-encode."""
+    with Image.open(path) as img:
+        img.load()
+        if VISION_GRAYSCALE and is_grayscale(img):
+            img = img.convert("L")
+        elif img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.thumbnail((VISION_MAX_EDGE, VISION_MAX_EDGE))
+
+        buffer = io.BytesIO()
+        img.save(buffer, format=VISION_IMAGE_FORMAT, quality=VISION_IMAGE_QUALITY)
+
+    mime_type = f"image/{VISION_IMAGE_FORMAT.lower()}"
+    encoded_string = base64.b64encode(buffer.getvalue()).decode("utf-8")
+    return f"data:{mime_type};base64,{encoded_string}"
+
+
+def prepare_image(path: str) -> str:
+    """
+    Data URL de l'image à envoyer au modèle de vision. Le résultat est mis
+    en cache par contenu : les appels suivants sur la même image ne la
+    relisent ni ne la ré-encodent.
+    """
+    key = make_key(
+        hash_file(path),
+        str(VISION_MAX_EDGE),
+        VISION_IMAGE_FORMAT,
+        str(VISION_IMAGE_QUALITY),
+        str(VISION_GRAYSCALE),
+    )
+    data_url = prepared_images.get(key)
+    if data_url is not None:
+        return data_url
+
+    try:
+        data_url = reencode(path)
+    except (UnidentifiedImageError, OSError) as e:
+        # Format non lisible par Pillow (ex: DICOM) : envoyé tel quel
+        logging.warning(f"Could not re-encode {path}, sending raw image: {e}")
+        data_url = encode_raw(path)
+
+    prepared_images.set(key, data_url)
+    return data_url